@@ -0,0 +1,45 @@
+import asyncio
+import contextvars
+import threading
+
+
+_loop = None
+_lock = threading.Lock()
+
+
+def get_loop():
+    """The process-wide event loop, running in a daemon thread.
+
+    Every script run and worker thread submits to the same loop, so the async
+    Groq client of llm_gateway, its connection pool and its rate limits are shared.
+    """
+    global _loop
+    if _loop is None:
+        with _lock:
+            if _loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="aio-loop", daemon=True).start()
+                _loop = loop
+    return _loop
+
+
+async def _in_context(context, coro):
+    # the task gets a copy of the loop thread's context, carry over the caller's values
+    for var, value in context.items():
+        var.set(value)
+    return await coro
+
+
+def submit(coro):
+    """Schedule `coro` on the shared loop, it sees the caller's context variables."""
+    return asyncio.run_coroutine_threadsafe(_in_context(contextvars.copy_context(), coro), get_loop())
+
+
+def run(coro, timeout=None):
+    """Run `coro` on the shared loop and block the calling thread until it finishes."""
+    future = submit(coro)
+    try:
+        return future.result(timeout)
+    except BaseException:
+        future.cancel()
+        raise
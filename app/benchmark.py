@@ -0,0 +1,227 @@
+"""Offline end-to-end latency benchmark.
+
+Runs the real router, Chroma retrieval and SQLite queries, with the Groq calls answered
+by stub_llm, over resources/benchmark_queries.csv:
+
+    python benchmark.py --rounds 3 --baseline ../bench_results/<commit>.json
+
+Tiering and hedging show under an injected slow tail, for example
+--tail-rate 0.2 --tail-models llama-3.3-70b-versatile, run once with and once
+without --hedge.
+"""
+import argparse
+import csv
+import json
+import os
+import subprocess
+import time
+from collections import defaultdict
+from pathlib import Path
+
+import stub_llm
+
+
+corpus_path = Path(__file__).parent / "resources/benchmark_queries.csv"
+results_dir = Path(__file__).parent.parent / "bench_results"
+
+STAGES = ["embed", "route", "retrieval", "sql_exec", "ttft", "chain", "total"]
+
+
+def load_corpus(path=corpus_path):
+    with open(path, newline="") as f:
+        return [(row["query"], row["route"]) for row in csv.DictReader(f)]
+
+
+def percentiles(values):
+    values = sorted(values)
+    if not values:
+        return None
+
+    def pick(q):
+        return round(values[min(len(values) - 1, int(q * len(values)))], 2)
+
+    return {
+        "n": len(values),
+        "mean": round(sum(values) / len(values), 2),
+        "p50": pick(0.50),
+        "p95": pick(0.95),
+        "p99": pick(0.99),
+    }
+
+
+def _commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=Path(__file__).parent, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def _ms(start):
+    return (time.perf_counter() - start) * 1000
+
+
+def run(rounds=3, corpus=None):
+    corpus = corpus or load_corpus()
+    server = stub_llm.start()
+    os.environ["GROQ_BASE_URL"] = server.base_url
+    os.environ["GROQ_API_KEY"] = "stub"
+    os.environ.setdefault("GROQ_MODEL", "llama-3.3-70b-versatile")
+    os.environ.setdefault("GROQ_FAST", "llama-3.1-8b-instant")
+    # the stub has no quota, gateway buckets would only time their own waits
+    os.environ.update(LLM_RPM="0", LLM_TPM="0", LLM_MODEL_LIMITS="")
+
+    # llm_gateway creates its Groq client on import, so they only come in once the stub is up
+    import aio
+    import catalog
+    import faq
+    import fast_sql
+    import general_qa
+    import llm_gateway
+    import models
+    import pipeline
+    import router
+    import sql
+
+    faq.ingest_faq_data(faq.faq_path)
+    general_qa.general_data_ingest(general_qa.general_qa_path)
+    catalog.prepare_catalog()
+    router.get_router()
+    router.embed("warm up")
+
+    async def answer(query, route):
+        start = time.perf_counter()
+        first = None
+        async for _ in pipeline.respond_stream(query, route, listing={}):
+            if first is None:
+                first = _ms(start)
+        return first, _ms(start)
+
+    timings = defaultdict(lambda: defaultdict(list))
+    agreed = 0
+    for _ in range(rounds):
+        for query, label in corpus:
+            stage = timings[label]
+
+            start = time.perf_counter()
+            vector = router.embed(query)
+            stage["embed"].append(_ms(start))
+
+            start = time.perf_counter()
+            choice = router.router(text=query, vector=vector)
+            stage["route"].append(_ms(start))
+            predicted = choice.name if choice is not None and choice.name else "fallback"
+            agreed += predicted == label
+
+            if label in ("faq", "general_qa"):
+                lookup = faq.get_relevant_qa if label == "faq" else general_qa.query_relevant_answ
+                start = time.perf_counter()
+                lookup(query)
+                stage["retrieval"].append(_ms(start))
+
+            if label == "sql":
+                compiled = fast_sql.compile_query(query)
+                if compiled is not None:
+                    start = time.perf_counter()
+                    sql.run_first_page(*compiled)
+                    stage["sql_exec"].append(_ms(start))
+
+            ttft, chain = aio.run(answer(query, label))
+            if ttft is not None:
+                stage["ttft"].append(ttft)
+            stage["chain"].append(chain)
+            stage["total"].append(stage["embed"][-1] + stage["route"][-1] + chain)
+
+    overall = defaultdict(list)
+    for stages in timings.values():
+        for name, values in stages.items():
+            overall[name] += values
+
+    server.shutdown()
+    return {
+        "commit": _commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": {
+            "rounds": rounds,
+            "queries": len(corpus),
+            "embedding_backend": models.EMBEDDING_BACKEND,
+            "stub": {
+                "ttft": stub_llm.TTFT,
+                "token_delay": stub_llm.TOKEN_DELAY,
+                "answer_tokens": stub_llm.ANSWER_TOKENS,
+                "tail_rate": stub_llm.TAIL_RATE,
+                "tail_delay": stub_llm.TAIL_DELAY,
+                "tail_models": sorted(stub_llm.TAIL_MODELS),
+            },
+            "llm_limits": llm_gateway.limits(),
+            "llm_hedge": llm_gateway.HEDGE,
+            "latency_targets": llm_gateway.LATENCY_TARGETS,
+        },
+        "router_agreement": round(agreed / (rounds * len(corpus)), 4),
+        "fast_path": fast_sql.stats(),
+        "llm_requests": dict(stub_llm.counters),
+        "llm_gateway": llm_gateway.stats(),
+        "stages_ms": {name: percentiles(overall[name]) for name in STAGES if overall[name]},
+        "routes_ms": {
+            route: {name: percentiles(stages[name]) for name in STAGES if stages[name]}
+            for route, stages in sorted(timings.items())
+        },
+    }
+
+
+def compare(result, baseline):
+    """Print p50/p95 changes against an earlier result."""
+    print(f"against {baseline.get('commit')} ({baseline.get('timestamp')})")
+    for route, stages in result["routes_ms"].items():
+        for name, current in stages.items():
+            before = baseline.get("routes_ms", {}).get(route, {}).get(name)
+            if not before:
+                continue
+            changes = []
+            for p in ("p50", "p95"):
+                delta = current[p] - before[p]
+                pct = f" ({delta / before[p]:+.0%})" if before[p] else ""
+                changes.append(f"{p} {before[p]:.1f} -> {current[p]:.1f}ms{pct}")
+            print(f"  {route:<10} {name:<9} " + ", ".join(changes))
+
+
+def _print(result):
+    print(f"commit {result['commit']}, {result['config']['queries']} queries x {result['config']['rounds']} rounds, "
+          f"router agreement {result['router_agreement']:.1%}")
+    for route, stages in result["routes_ms"].items():
+        for name, p in stages.items():
+            print(f"  {route:<10} {name:<9} p50 {p['p50']:>8.1f}  p95 {p['p95']:>8.1f}  p99 {p['p99']:>8.1f} ms")
+    gateway = result["llm_gateway"]
+    print(f"  llm: {gateway['tier_fallbacks']} tier fallbacks, {gateway['hedged']} hedged calls "
+          f"({gateway['hedge_wins']} won by the hedge), {gateway['retries']} retries")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--corpus", type=Path, default=corpus_path)
+    parser.add_argument("--out", type=Path, help="defaults to bench_results/<commit>.json")
+    parser.add_argument("--baseline", type=Path, help="an earlier result to compare with")
+    parser.add_argument("--tail-rate", type=float, default=stub_llm.TAIL_RATE)
+    parser.add_argument("--tail-models", default=",".join(sorted(stub_llm.TAIL_MODELS)),
+                        help="models the slow tail applies to, all when empty")
+    parser.add_argument("--hedge", action="store_true", help="hedge SQL generation (LLM_HEDGE=1)")
+    args = parser.parse_args()
+
+    stub_llm.TAIL_RATE = args.tail_rate
+    stub_llm.TAIL_MODELS = {m for m in args.tail_models.split(",") if m}
+    if args.hedge:
+        os.environ["LLM_HEDGE"] = "1"
+
+    result = run(args.rounds, load_corpus(args.corpus))
+    _print(result)
+
+    out = args.out or results_dir / f"{result['commit']}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(result, indent=2))
+    print(f"saved {out}")
+
+    if args.baseline:
+        compare(result, json.loads(args.baseline.read_text()))
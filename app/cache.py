@@ -0,0 +1,154 @@
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+
+
+common_queries_path = Path(__file__).parent / "resources/common_queries.txt"
+
+SIMILARITY_THRESHOLD = float(os.environ.get("CACHE_SIMILARITY", 0.92))
+MAX_ENTRIES = int(os.environ.get("CACHE_MAX_ENTRIES", 512))
+
+# seconds an answer stays valid per route, 0 disables caching for the route.
+# engine only stores answers of turns without session history, so a shared answer
+# never carries another user's conversation. general_qa and fallback are not shared
+# between users unless explicitly enabled.
+ROUTE_TTL = {
+    "faq": int(os.environ.get("CACHE_TTL_FAQ", 24 * 3600)),
+    "sql": int(os.environ.get("CACHE_TTL_SQL", 3600)),
+    "general_qa": int(os.environ.get("CACHE_TTL_GENERAL_QA", 0)),
+    "fallback": int(os.environ.get("CACHE_TTL_FALLBACK", 0)),
+}
+
+# product answers differ by a single brand or number, so they need a tighter match
+ROUTE_THRESHOLD = {
+    "sql": float(os.environ.get("CACHE_SIMILARITY_SQL", 0.96)),
+}
+
+_entries = OrderedDict()
+_lock = threading.Lock()
+_warmed = False
+
+counters = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0, "expired": 0}
+
+
+def normalize_text(query):
+    return " ".join(re.findall(r"[a-z0-9₹]+", query.lower()))
+
+
+def _numbers(query):
+    return sorted(re.findall(r"\d+(?:\.\d+)?", query))
+
+
+def _unit(vector):
+    vector = np.asarray(vector, dtype=np.float32).ravel()
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def is_cacheable(route):
+    return ROUTE_TTL.get(route, 0) > 0
+
+
+def lookup(route, query, vector):
+    if not is_cacheable(route):
+        return None
+
+    now = time.time()
+    query_vec = _unit(vector)
+    threshold = ROUTE_THRESHOLD.get(route, SIMILARITY_THRESHOLD)
+    numbers = _numbers(query)
+
+    with _lock:
+        best_key, best_score = None, threshold
+        for key, entry in list(_entries.items()):
+            if entry["expires"] <= now:
+                del _entries[key]
+                counters["expired"] += 1
+                continue
+            if entry["route"] != route:
+                continue
+            # "laptops below 80k" and "laptops below 50k" embed almost identically
+            if entry["numbers"] != numbers:
+                continue
+            score = float(np.dot(entry["vector"], query_vec))
+            if score >= best_score:
+                best_key, best_score = key, score
+
+        if best_key is None:
+            counters["misses"] += 1
+            return None
+
+        _entries.move_to_end(best_key)
+        counters["hits"] += 1
+        return _entries[best_key]["answer"]
+
+
+def store(route, query, vector, answer):
+    if not is_cacheable(route) or not answer:
+        return
+
+    key = (route, normalize_text(query))
+    with _lock:
+        _entries[key] = {
+            "route": route,
+            "query": query,
+            "numbers": _numbers(query),
+            "vector": _unit(vector),
+            "answer": answer,
+            "expires": time.time() + ROUTE_TTL[route],
+        }
+        _entries.move_to_end(key)
+        counters["stores"] += 1
+
+        while len(_entries) > MAX_ENTRIES:
+            _entries.popitem(last=False)
+            counters["evictions"] += 1
+
+
+def clear():
+    with _lock:
+        _entries.clear()
+
+
+def stats():
+    with _lock:
+        total = counters["hits"] + counters["misses"]
+        return {
+            **counters,
+            "entries": len(_entries),
+            "hit_rate": counters["hits"] / total if total else 0.0,
+        }
+
+
+def warm(path, answer_fn):
+    """Answer every query in `path` once and keep the results in the cache.
+
+    `answer_fn(query)` must return `(route, vector, answer)`. Runs once per process.
+    """
+    global _warmed
+    if _warmed:
+        return
+    _warmed = True
+
+    path = Path(path)
+    if not path.exists():
+        print(f"cache warm file {path} not found")
+        return
+
+    queries = [
+        line.strip() for line in path.read_text(encoding="utf-8").splitlines()
+        if line.strip() and not line.strip().startswith("#")
+    ]
+    for query in queries:
+        try:
+            route, vector, answer = answer_fn(query)
+        except Exception as e:
+            print(f"cache warm failed for {query!r}: {e}")
+            continue
+        store(route, query, vector, answer)
+    print(f"cache warmed with {stats()['entries']} answers")
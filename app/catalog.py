@@ -0,0 +1,168 @@
+import hashlib
+import os
+import sqlite3
+from pathlib import Path
+
+
+sqldb_path = Path(__file__).parent / "db.sqlite"
+
+# ratings a product counts as having at the catalog average, before its own ratings
+RANK_PRIOR_RATINGS = int(os.environ.get("RANK_PRIOR_RATINGS", 500))
+PRICE_BUCKETS = 5
+
+# the filter/sort columns the generated SQL uses, each index carries the columns
+# it is usually combined with so the sort can be read straight from the index
+INDEXES = [
+    "CREATE INDEX IF NOT EXISTS idx_product_price ON product(price, avg_rating, total_ratings)",
+    "CREATE INDEX IF NOT EXISTS idx_product_brand ON product(LOWER(brand), price)",
+    "CREATE INDEX IF NOT EXISTS idx_product_rating ON product(avg_rating, total_ratings)",
+    "CREATE INDEX IF NOT EXISTS idx_product_total_ratings ON product(total_ratings, avg_rating)",
+]
+
+# external content table: the text lives once in `product`, the triggers keep
+# the full-text index in step with every insert, update and delete
+FULL_TEXT = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS product_fts USING fts5(
+        title, brand,
+        content='product', content_rowid='rowid',
+        tokenize='porter unicode61'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS product_fts_ai AFTER INSERT ON product BEGIN
+        INSERT INTO product_fts(rowid, title, brand) VALUES (new.rowid, new.title, new.brand);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS product_fts_ad AFTER DELETE ON product BEGIN
+        INSERT INTO product_fts(product_fts, rowid, title, brand) VALUES ('delete', old.rowid, old.title, old.brand);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS product_fts_au AFTER UPDATE ON product BEGIN
+        INSERT INTO product_fts(product_fts, rowid, title, brand) VALUES ('delete', old.rowid, old.title, old.brand);
+        INSERT INTO product_fts(rowid, title, brand) VALUES (new.rowid, new.title, new.brand);
+    END""",
+]
+
+
+# orderings precomputed from `product`, so "top rated" or "most popular" reads the first rows
+# of an index instead of sorting the catalog. score is the rating pulled towards the
+# catalog average by RANK_PRIOR_RATINGS, so 5.0 from 2 ratings ranks below 4.6 from 40,000
+RANKINGS = [
+    "DROP VIEW IF EXISTS product_ranked",
+    "DROP TABLE IF EXISTS product_rank",
+    """CREATE TABLE product_rank (
+        product_rowid INTEGER PRIMARY KEY,
+        score REAL,
+        score_rank INTEGER,
+        popularity_rank INTEGER,
+        price_bucket INTEGER,
+        bucket_rank INTEGER,
+        brand_rank INTEGER
+    )""",
+    """INSERT INTO product_rank
+    SELECT rowid, score,
+        ROW_NUMBER() OVER (ORDER BY score DESC, total_ratings DESC, rowid),
+        ROW_NUMBER() OVER (ORDER BY total_ratings DESC, avg_rating DESC, rowid),
+        price_bucket,
+        ROW_NUMBER() OVER (PARTITION BY price_bucket ORDER BY score DESC, rowid),
+        ROW_NUMBER() OVER (PARTITION BY LOWER(brand) ORDER BY score DESC, rowid)
+    FROM (
+        SELECT rowid, brand, avg_rating, total_ratings,
+            (total_ratings * avg_rating + :prior * (SELECT AVG(avg_rating) FROM product)) / (total_ratings + :prior)
+                AS score,
+            NTILE(:buckets) OVER (ORDER BY price, rowid) AS price_bucket
+        FROM product
+        WHERE avg_rating IS NOT NULL
+    )""",
+    "CREATE UNIQUE INDEX idx_rank_score ON product_rank(score_rank)",
+    "CREATE UNIQUE INDEX idx_rank_popularity ON product_rank(popularity_rank)",
+    "CREATE UNIQUE INDEX idx_rank_bucket ON product_rank(price_bucket, bucket_rank)",
+    """CREATE VIEW product_ranked AS
+    SELECT product.*, product_rank.*
+    FROM product_rank JOIN product ON product.rowid = product_rank.product_rowid""",
+]
+
+
+def _fts_in_sync(conn):
+    try:
+        conn.execute("INSERT INTO product_fts(product_fts, rank) VALUES ('integrity-check', 1)")
+        return True
+    except sqlite3.DatabaseError:
+        return False
+
+
+def prepare_catalog(db_path=sqldb_path):
+    """Create the product indexes and the full-text table. Safe to run on every start."""
+    with sqlite3.connect(db_path) as conn:
+        created = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'product_fts'"
+        ).fetchone() is None
+
+        for statement in INDEXES + FULL_TEXT:
+            conn.execute(statement)
+
+        # VACUUM may renumber the rowids of `product`, the index is rebuilt if so
+        if created or not _fts_in_sync(conn):
+            print("building product_fts")
+            conn.execute("INSERT INTO product_fts(product_fts) VALUES ('rebuild')")
+            conn.execute("ANALYZE")
+
+        prepare_rankings(conn)
+
+
+# every write to `product` counts, so any edit, brand and title ones too, rebuilds the rankings
+CHANGE_COUNTER = [
+    "CREATE TABLE IF NOT EXISTS catalog_changes (n INTEGER NOT NULL)",
+    "INSERT INTO catalog_changes SELECT 0 WHERE NOT EXISTS (SELECT 1 FROM catalog_changes)",
+    """CREATE TRIGGER IF NOT EXISTS catalog_changes_ai AFTER INSERT ON product BEGIN
+        UPDATE catalog_changes SET n = n + 1;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS catalog_changes_ad AFTER DELETE ON product BEGIN
+        UPDATE catalog_changes SET n = n + 1;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS catalog_changes_au AFTER UPDATE ON product BEGIN
+        UPDATE catalog_changes SET n = n + 1;
+    END""",
+]
+
+
+def catalog_fingerprint(conn):
+    """Changes with any insert, update or delete on `product`, and with renumbered rowids.
+
+    Writes are counted by the catalog_changes triggers, VACUUM fires none of them and
+    is caught by the rowid-weighted sum.
+    """
+    changes = conn.execute("SELECT n FROM catalog_changes").fetchone()
+    row = conn.execute(
+        "SELECT COUNT(*), MAX(rowid), TOTAL((rowid % 997) * (price + total_ratings)) FROM product"
+    ).fetchone()
+    return hashlib.sha1(repr((changes, row, RANK_PRIOR_RATINGS, PRICE_BUCKETS)).encode()).hexdigest()
+
+
+def prepare_rankings(conn):
+    """Rebuild product_rank when the catalog changed since it was built."""
+    # without the triggers in place, earlier writes went uncounted
+    counted = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'catalog_changes_au'").fetchone()
+    for statement in CHANGE_COUNTER:
+        conn.execute(statement)
+    conn.execute("CREATE TABLE IF NOT EXISTS ranking_meta (fingerprint TEXT)")
+    fingerprint = catalog_fingerprint(conn)
+    built = conn.execute("SELECT fingerprint FROM ranking_meta").fetchone()
+    exists = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'product_ranked'").fetchone()
+    if counted and exists and built and built[0] == fingerprint:
+        return False
+
+    print("building product_rank")
+    for statement in RANKINGS:
+        conn.execute(statement, {"prior": RANK_PRIOR_RATINGS, "buckets": PRICE_BUCKETS}
+                     if ":prior" in statement else ())
+    conn.execute("DELETE FROM ranking_meta")
+    conn.execute("INSERT INTO ranking_meta VALUES (?)", (fingerprint,))
+    conn.execute("ANALYZE product_rank")
+    return True
+
+
+if __name__ == "__main__":
+    prepare_catalog()
+    with sqlite3.connect(sqldb_path) as conn:
+        plan = conn.execute(
+            "EXPLAIN QUERY PLAN SELECT * FROM product WHERE rowid IN "
+            "(SELECT rowid FROM product_fts WHERE product_fts MATCH 'brand:nike AND title:shoes')"
+        ).fetchall()
+    print(plan)
@@ -0,0 +1,146 @@
+"""Synthetic product catalogs of any size, shaped like the bundled db.sqlite.
+
+Every generated row starts from a real product: its title words, price, rating and
+rating count are kept with some noise, so category, price and popularity stay
+correlated the way they are in the real data. Brands follow the real long tail and
+grow with the catalog, new brands borrow the products of an existing one.
+
+    python catalog_gen.py --rows 1000000 --out ../bench_results/catalogs/product-1000000.sqlite
+"""
+import argparse
+import re
+import sqlite3
+import time
+from pathlib import Path
+
+import numpy as np
+
+import catalog
+
+
+COLOURS = ["Black", "White", "Blue", "Red", "Green", "Grey", "Navy", "Beige", "Pink", "Brown"]
+SYLLABLES = ["ka", "ro", "zen", "tri", "vo", "la", "mi", "sha", "ax", "el", "no", "vi", "ra", "tek", "lo", "su"]
+
+# brands grow with the square root of the catalog, as they do from the sample to the full catalog
+BRAND_GROWTH = 0.5
+# share of rows a brand gets falls off as rank ** -ZIPF past the real brands
+ZIPF = 1.1
+
+
+def load_source(path=catalog.sqldb_path):
+    with sqlite3.connect(path) as conn:
+        schema = conn.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'product'").fetchone()[0]
+        rows = conn.execute(
+            "SELECT product_link, title, brand, price, avg_rating, total_ratings FROM product ORDER BY brand, rowid"
+        ).fetchall()
+    return schema, rows
+
+
+def _brand_name(rng, taken):
+    while True:
+        name = "".join(rng.choice(SYLLABLES, rng.integers(2, 4))).title()
+        if rng.random() < 0.2:
+            name += " " + rng.choice(["Fashion", "Retail", "Store", "Wear", "Tech", "Home"])
+        if name.lower() not in taken:
+            taken.add(name.lower())
+            return name
+
+
+def plan_brands(source_rows, total, rng):
+    """(brand names, share of rows, template rows of each brand)."""
+    groups = {}
+    for i, row in enumerate(source_rows):
+        groups.setdefault(row[2], []).append(i)
+    names = sorted(groups, key=lambda name: -len(groups[name]))
+    counts = [len(groups[name]) for name in names]
+    templates = [np.array(groups[name]) for name in names]
+
+    wanted = max(len(names), int(len(names) * (total / len(source_rows)) ** BRAND_GROWTH))
+    taken = {name.lower() for name in names}
+    smallest = counts[-1]
+    for rank in range(len(names) + 1, wanted + 1):
+        names.append(_brand_name(rng, taken))
+        counts.append(smallest * (len(counts) / rank) ** ZIPF)
+        templates.append(templates[rng.integers(len(templates))])
+
+    weights = np.array(counts, dtype=np.float64)
+    return names, weights / weights.sum(), templates
+
+
+def _slug(text):
+    return re.sub(r"[^a-z0-9]+", "-", text.lower()).strip("-")
+
+
+def rows(total, seed=0, source=catalog.sqldb_path, batch=100_000):
+    """Generated (product_link, title, brand, price, avg_rating, total_ratings) tuples."""
+    rng = np.random.default_rng(seed)
+    _, source_rows = load_source(source)
+    names, shares, templates = plan_brands(source_rows, total, rng)
+
+    done = 0
+    while done < total:
+        size = min(batch, total - done)
+        brands = rng.choice(len(names), size, p=shares)
+        picks = rng.random(size)
+        prices = rng.lognormal(0, 0.25, size)
+        ratings = rng.normal(0, 0.3, size)
+        counts = rng.lognormal(0, 1.0, size)
+        colours = rng.integers(-len(COLOURS), len(COLOURS), size)
+
+        for j in range(size):
+            group = templates[brands[j]]
+            link, title, brand, price, rating, rated = source_rows[group[int(picks[j] * len(group))]]
+            name = names[brands[j]]
+            if title.lower().startswith(brand.lower()):
+                title = title[len(brand):].lstrip()
+            title = f"{name} {title}"
+            if colours[j] >= 0:
+                title += f" ({COLOURS[colours[j]]})"
+            query = link[link.find("?"):] if "?" in link else ""
+            yield (
+                f"https://www.flipkart.com/{_slug(title)[:80]}/p/itm{done + j:013x}{query}",
+                title,
+                name,
+                max(49, int(round(price * prices[j]))),
+                round(min(5.0, max(1.0, rating + ratings[j])), 1),
+                max(1, int(rated * counts[j])),
+            )
+        done += size
+
+
+def generate(path, total, seed=0, source=catalog.sqldb_path, indexes=False):
+    """Write a catalog of `total` rows to `path`, replacing it. Returns what was built."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.unlink(missing_ok=True)
+    schema, _ = load_source(source)
+
+    start = time.perf_counter()
+    with sqlite3.connect(path) as conn:
+        conn.execute("PRAGMA journal_mode = OFF")
+        conn.execute("PRAGMA synchronous = OFF")
+        conn.execute(schema)
+        conn.executemany("INSERT INTO product VALUES (?, ?, ?, ?, ?, ?)", rows(total, seed, source))
+        brands = conn.execute("SELECT COUNT(DISTINCT brand) FROM product").fetchone()[0]
+    conn.close()
+    loaded = time.perf_counter() - start
+
+    if indexes:
+        catalog.prepare_catalog(path)
+    return {
+        "rows": total,
+        "brands": brands,
+        "load_seconds": round(loaded, 1),
+        "index_seconds": round(time.perf_counter() - start - loaded, 1) if indexes else None,
+        "mb": round(path.stat().st_size / 2**20, 1),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--out", type=Path, required=True)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--indexes", action="store_true", help="also build the indexes and product_fts")
+    args = parser.parse_args()
+    print(generate(args.out, args.rows, args.seed, indexes=args.indexes))
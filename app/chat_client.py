@@ -0,0 +1,54 @@
+import codecs
+import json
+import os
+import urllib.error
+import urllib.request
+
+
+# the chat API to talk to, the engine runs inside this process when unset
+API_URL = os.environ.get("CHAT_API_URL", "").rstrip("/")
+TIMEOUT = float(os.environ.get("CHAT_API_TIMEOUT", 120))
+
+UNREACHABLE_REPLY = "⚠️ I can't reach the assistant right now. Please try again in a few minutes."
+
+
+def prepare():
+    if not API_URL:
+        import engine
+        engine.prepare()
+
+
+def _remote(session_id, query):
+    request = urllib.request.Request(
+        f"{API_URL}/chat",
+        data=json.dumps({"session_id": session_id, "message": query, "stream": True}).encode(),
+        headers={"Content-Type": "application/json"},
+        method="POST",
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=TIMEOUT) as response:
+            decoder = codecs.getincrementaldecoder("utf-8")()
+            while True:
+                data = response.read1(4096)
+                if not data:
+                    break
+                text = decoder.decode(data)
+                if text:
+                    yield text
+            tail = decoder.decode(b"", final=True)
+            if tail:
+                yield tail
+    except urllib.error.HTTPError as e:
+        print(f"chat API answered {e.code}")
+        yield UNREACHABLE_REPLY
+    except (urllib.error.URLError, OSError) as e:
+        print(f"chat API unreachable: {e}")
+        yield UNREACHABLE_REPLY
+
+
+def stream(session_id, query):
+    """The reply to `query` as it is produced, from the chat API or the local engine."""
+    if API_URL:
+        return _remote(session_id, query)
+    import engine
+    return engine.stream(session_id, query)
@@ -0,0 +1,96 @@
+import os
+import queue
+import re
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+
+sqldb_path = Path(__file__).parent / "db.sqlite"
+
+POOL_SIZE = int(os.environ.get("SQL_POOL_SIZE", 4))
+MAX_ROWS = int(os.environ.get("SQL_MAX_ROWS", 50))
+CACHE_SIZE_KB = int(os.environ.get("SQLITE_CACHE_KB", 16 * 1024))
+MMAP_SIZE = int(os.environ.get("SQLITE_MMAP_BYTES", 256 * 2**20))
+
+_LIMIT_TAIL = re.compile(r"\blimit\s+(\d+)(?:\s+offset\s+(\d+)|\s*,\s*(\d+))?\s*$", re.IGNORECASE)
+_LIMIT_WORD = re.compile(r"\blimit\b", re.IGNORECASE)
+
+_pool = queue.LifoQueue()
+_created = 0
+_lock = threading.Lock()
+
+
+def _connect():
+    conn = sqlite3.connect(
+        f"file:{sqldb_path}?mode=ro",
+        uri=True,
+        check_same_thread=False,
+    )
+    conn.execute("PRAGMA query_only = ON")
+    conn.execute(f"PRAGMA cache_size = {-CACHE_SIZE_KB}")
+    conn.execute(f"PRAGMA mmap_size = {MMAP_SIZE}")
+    return conn
+
+
+@contextmanager
+def connection():
+    global _created
+    try:
+        conn = _pool.get_nowait()
+    except queue.Empty:
+        conn = None
+        with _lock:
+            if _created < POOL_SIZE:
+                _created += 1
+                conn = _connect()
+        if conn is None:
+            conn = _pool.get()
+    try:
+        yield conn
+    finally:
+        _pool.put(conn)
+
+
+def enforce_limit(statement, limit):
+    """Return `statement` with a LIMIT of at most `limit` rows."""
+    statement = statement.strip().rstrip(";").strip()
+    match = _LIMIT_TAIL.search(statement)
+    if match:
+        if match.group(3) is not None:
+            # LIMIT offset, count
+            count = min(int(match.group(3)), limit)
+            return f"{statement[:match.start()]}LIMIT {match.group(1)}, {count}"
+        count = min(int(match.group(1)), limit)
+        offset = f" OFFSET {match.group(2)}" if match.group(2) is not None else ""
+        return f"{statement[:match.start()]}LIMIT {count}{offset}"
+    words = list(_LIMIT_WORD.finditer(statement))
+    tail = statement[words[-1].end():] if words else ""
+    if words and tail.count("(") == tail.count(")"):
+        # LIMIT with an expression, cap it from the outside
+        return f"SELECT * FROM ({statement}) LIMIT {limit}"
+    return f"{statement} LIMIT {limit}"
+
+
+def execute(statement, params=(), limit=MAX_ROWS):
+    """Run a read-only statement and return its rows as dicts."""
+    if limit is not None:
+        statement = enforce_limit(statement, limit)
+    with connection() as conn:
+        cursor = conn.execute(statement, params)
+        columns = [column[0] for column in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+
+def close_all():
+    """Close the idle connections, ones in use go back to the pool as usual."""
+    global _created
+    with _lock:
+        while True:
+            try:
+                conn = _pool.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            _created -= 1
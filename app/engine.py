@@ -0,0 +1,255 @@
+import re
+import threading
+import time
+import traceback
+from collections import OrderedDict
+
+import groq
+
+import aio
+import cache
+import catalog
+import fast_sql
+import faq
+import fallback_qa
+import general_qa
+import llm_gateway
+import memory
+import models
+import pagination
+import pipeline
+import router
+import singleflight
+import sql
+import sql_templates
+import streaming
+import summarizer
+import telemetry
+
+
+THANKS = {"thanks", "thank you", "ya thank you", "thx"}
+THANKS_REPLY = "😊 You're welcome! Let me know if you need help shopping."
+NO_ROUTE_REPLY = "I can't assist you with that"
+UNAVAILABLE_REPLY = (
+    "⚠️ I’m temporarily unavailable due to high traffic or system load. "
+    "Please try again in a few minutes."
+)
+FAILED_REPLY = "⚠️ Something went wrong while answering that. Please try again or rephrase your question."
+
+# "show more" cursors per session, bounded like the conversation memory
+_listings = OrderedDict()
+_listings_lock = threading.Lock()
+
+_prepared = False
+_prepare_lock = threading.Lock()
+
+
+def force_sql(query: str) -> bool:
+    q = query.lower()
+
+    price_pattern = r"(under|below|less than)\s*\d+(\s?k)?|\brs\.?\s*\d+|\b₹\s*\d+"
+
+    keywords = [
+        "rated", "rating", "ratings", "reviews", "popular",
+        "top rated", "best rated",
+        "show me", "find", "list", "give me", "provide me"
+    ]
+
+    return (
+        re.search(price_pattern, q) is not None
+        or any(k in q for k in keywords)
+    )
+
+
+def pick_route(query, vector):
+    if force_sql(query):
+        return "sql"
+    route_obj = router.router(text=query, vector=vector)
+    if route_obj is None:
+        return None
+    return route_obj.name
+
+
+def warm_answer(query):
+    vector = router.embed(query)
+    route = pick_route(query, vector)
+    if route is None or not cache.is_cacheable(route):
+        return route, vector, None
+
+    # no session, warm answers are built without any conversation history
+    answer = aio.run(pipeline.respond(query, route))
+    return route, vector, answer
+
+
+def prepare():
+    """Load the data and warm the caches, once per process."""
+    global _prepared
+    if _prepared:
+        return
+    with _prepare_lock:
+        if _prepared:
+            return
+        faq.ingest_faq_data(faq.faq_path)
+        general_qa.general_data_ingest(general_qa.general_qa_path)
+        catalog.prepare_catalog()
+        cache.warm(cache.common_queries_path, warm_answer)
+
+        for name, collect in {
+            "answer_cache": cache.stats,
+            "fast_sql": fast_sql.stats,
+            "memory": memory.stats,
+            "summarizer": summarizer.stats,
+            "models": models.stats,
+            "singleflight": singleflight.stats,
+            "llm_gateway": llm_gateway.stats,
+            "sql_templates": sql_templates.stats,
+        }.items():
+            telemetry.register(name, collect)
+        telemetry.start()
+        _prepared = True
+
+
+def failure_message(error):
+    # logged in full, the user only learns whether retrying later should help
+    traceback.print_exc()
+    telemetry.count("chat_errors_total", error=type(error).__name__)
+    if isinstance(error, (groq.RateLimitError, groq.APITimeoutError, groq.APIConnectionError, TimeoutError)):
+        return UNAVAILABLE_REPLY
+    return FAILED_REPLY
+
+
+def listing(session_id):
+    """The "show more" cursor of a session, a dict the SQL chain fills in."""
+    with _listings_lock:
+        state = _listings.get(session_id)
+        if state is None:
+            state = _listings[session_id] = {}
+            while len(_listings) > memory.MAX_SESSIONS:
+                _listings.popitem(last=False)
+        else:
+            _listings.move_to_end(session_id)
+        return state
+
+
+def forget(session_id):
+    with _listings_lock:
+        _listings.pop(session_id, None)
+    memory.forget(session_id)
+
+
+def _has_history(session_id):
+    summary, recent_msgs = memory.load(session_id)
+    return bool(summary or recent_msgs)
+
+
+def stream(session_id, query):
+    """Answer one chat turn, yielding the text as it is produced.
+
+    Handles the thanks short-circuit, "show more", routing, the answer cache and the
+    chains. Errors end the stream with a message for the user instead of raising.
+    """
+    q_clean = query.lower().strip()
+    turn_start = time.perf_counter()
+    session_listing = listing(session_id)
+    retrievals = {}
+
+    with telemetry.turn() as turn_span:
+        try:
+            if q_clean in THANKS:
+                yield THANKS_REPLY
+                return
+
+            if pagination.is_more_request(q_clean) and session_listing:
+                turn_span.tag(route="sql_more")
+                with telemetry.span("sql_more"):
+                    more = sql.more_results(session_listing)
+                yield more
+                return
+
+            session_listing.clear()
+
+            with telemetry.span("force_sql"):
+                forced = force_sql(query)
+
+            # ROUTING, the general_qa lookup runs while the query is embedded
+            vector, retrievals = aio.run(
+                pipeline.embed_and_retrieve(query, speculate=not forced)
+            )
+            with telemetry.span("route"):
+                route = pick_route(query, vector)
+            turn_span.tag(route=route or "none")
+
+            # RESPONSE
+            if route is None:
+                yield NO_ROUTE_REPLY
+                return
+
+            # every chain folds the session history into its prompt, so only answers to turns
+            # without history are stored. Those depend on the query alone and serve any turn
+            history = _has_history(session_id)
+            with telemetry.span("cache_lookup", route=route) as lookup_span:
+                answer = cache.lookup(route, query, vector)
+                lookup_span.tag(cache="miss" if answer is None else "hit")
+            turn_span.tag(cache="miss" if answer is None else "hit")
+
+            if answer is not None:
+                if route == "sql":
+                    sql.prime_listing(query, session_listing)
+                memory.remember(
+                    session_id, query, answer,
+                    pipeline.SUMMARIZE.get(route, fallback_qa.asummarize_conversation),
+                )
+                yield answer
+                return
+
+            # tokens go out as they arrive, bookkeeping waits for the last one
+            result = {}
+
+            def produce():
+                return streaming.timed(
+                    streaming.iterate(pipeline.respond_stream(
+                        query,
+                        route,
+                        retrievals,
+                        session=session_id,
+                        listing=session_listing,
+                        result=result,
+                    )),
+                    label=route,
+                    start=turn_start,
+                )
+
+            if history:
+                chunks = produce()
+            else:
+                # without history the answer only depends on the query, identical ones share a call
+                key = (route, cache.normalize_text(query))
+                chunks = singleflight.stream(key, produce, route=route)
+
+            text = []
+            for chunk in chunks:
+                text.append(chunk)
+                yield chunk
+
+            if "answer" in result:
+                if not history:
+                    cache.store(route, query, vector, result["answer"])
+            else:
+                turn_span.tag(cache="coalesced")
+                if route == "sql":
+                    sql.prime_listing(query, session_listing)
+                memory.remember(
+                    session_id, query, "".join(text).strip(),
+                    pipeline.SUMMARIZE.get(route, fallback_qa.asummarize_conversation),
+                )
+
+        except Exception as e:
+            yield failure_message(e)
+
+        finally:
+            # a no-op for lookups the chain already awaited or cancelled
+            pipeline.cancel(retrievals)
+
+
+def answer(session_id, query):
+    return "".join(stream(session_id, query))
@@ -1,12 +1,12 @@
-from groq import Groq
+import asyncio
 
-groq_client = Groq()
+import aio
+import llm_gateway
+import prompt_builder
+import streaming
 
-MAX_CHAT_TURNS = 4
-SUMMARY_TRIGGER = 8
 
-
-def summarize_conversation(recent_msgs):
+async def asummarize_conversation(recent_msgs):
     prompt = f"""
 Summarize the following conversation.
 Keep only key facts and user intent.
@@ -14,17 +14,16 @@ Keep only key facts and user intent.
 Conversation:
 {chr(10).join(recent_msgs)}
 """
-    completion = groq_client.chat.completions.create(
-        model=os.environ['GROQ_FAST'],
+    completion = await llm_gateway.complete(
+        model=llm_gateway.FAST_MODEL,
         messages=[{"role": "user", "content": prompt}],
+        priority=llm_gateway.BACKGROUND,
     )
     return completion.choices[0].message.content
 
 
-def fallback_chain(query, summary, recent_msgs):
-    chat_history = "\n".join(recent_msgs) if recent_msgs else "None"
-
-    system_prompt = f"""
+async def afallback_chain_stream(query, summary, recent_msgs):
+    system_prompt = """
 You are a polite, shopping-focused AI assistant for an e-commerce chatbot.
 
 You can:
@@ -52,31 +51,37 @@ Keep responses:
 - Professional
 - Strictly limited to supported capabilities
 - Never invent information
-
-Conversation summary:
-{summary}
-
-Recent conversation:
-{chat_history}
 """
 
-    completion = groq_client.chat.completions.create(
-        model="llama-3.3-70b-versatile",
-        messages=[
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": query},
-        ],
+    model = llm_gateway.pick_model("fallback")
+    messages, estimated = await asyncio.to_thread(
+        prompt_builder.build,
+        system_prompt,
+        query,
+        model=model,
+        query=query,
+        summary=summary,
+        recent_msgs=recent_msgs,
     )
+    usage = []
+    async for token in llm_gateway.stream(
+        on_usage=usage.append,
+        model=model,
+        messages=messages,
+    ):
+        yield token
+    prompt_builder.record("fallback_answer", estimated, usage[-1] if usage else None)
+
 
-    answer = completion.choices[0].message.content.strip()
+async def afallback_chain(query, summary, recent_msgs):
+    answer = await streaming.collect(afallback_chain_stream(query, summary, recent_msgs))
+    return answer.strip()
 
-    # ---- UPDATE MEMORY ----
-    recent_msgs.append(f"User: {query}")
-    recent_msgs.append(f"Assistant: {answer}")
 
-    if len(recent_msgs) > SUMMARY_TRIGGER * 2:
-        new_summary = summarize_conversation(recent_msgs)
-        summary = summary + "\n" + new_summary
-        recent_msgs = recent_msgs[-MAX_CHAT_TURNS * 2 :]
+# blocking wrappers for callers outside the event loop
+def summarize_conversation(recent_msgs):
+    return aio.run(asummarize_conversation(recent_msgs))
 
-    return answer, summary, recent_msgs
+
+def fallback_chain(query, summary, recent_msgs):
+    return aio.run(afallback_chain(query, summary, recent_msgs))
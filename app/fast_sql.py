@@ -0,0 +1,259 @@
+import re
+import threading
+
+import db_pool
+
+AMOUNT = r"(?:₹|rs\.?|inr)?\s*(\d+(?:\.\d+)?)\s*(k|thousands?|lakhs?|lacs?|l)?\b"
+
+UNITS = {"k": 1_000, "thousand": 1_000, "thousands": 1_000,
+         "lakh": 100_000, "lakhs": 100_000, "lac": 100_000, "lacs": 100_000, "l": 100_000}
+
+PRICE_RANGE = re.compile(rf"(?:between|from)?\s*{AMOUNT}\s*(?:to|and|-)\s*{AMOUNT}")
+PRICE_MAX = re.compile(
+    rf"(?:under|below|less than|lesser than|cheaper than|not more than|up ?to|within|max(?:imum)?)\s*(?:of\s*)?{AMOUNT}"
+)
+PRICE_MIN = re.compile(rf"(?:above|over|more than|greater than|at least|min(?:imum)?|starting (?:from|at))\s*{AMOUNT}")
+BARE_PRICE = re.compile(r"(?:₹|\brs\.?|\binr)\s*\d")
+CURRENCY = re.compile(r"₹|\brs\b|\binr\b")
+# a number after "under" or "above" is only a price with a unit, a currency or at least this value
+MIN_PRICE = 100
+# "above 4 rating" could be a price or a rating, leave it to the LLM
+RATING_OR_PRICE = re.compile(
+    r"\b(?:under|below|less than|above|over|more than|greater than|at least|up ?to|within)\s*"
+    r"(?:₹|rs\.?|inr)?\s*\d+(?:\.\d+)?\s*\+?\s*(?:stars?|ratings?|rated)\b"
+)
+RATING_WORD_BEFORE = re.compile(r"(?:rat(?:ing|ed)s?|stars?)\s*(?:of\s*)?$")
+
+RATING_MIN = [
+    re.compile(r"(?:rat(?:ing|ed)s?|stars?)\s*(?P<of>of\s*)?(?P<cmp>above|over|more than|greater than|at least|minimum|>=?)?"
+               r"\s*(?P<value>\d(?:\.\d)?)\b\s*(?P<unit>stars?|\+)?(?P<up>\s*(?:and|or|&)\s*(?:above|more|up))?"),
+    re.compile(r"(?<![\d.])(?P<value>\d(?:\.\d)?)\s*(?:\+\s*(?:stars?|ratings?|rated)|stars?(?:\s*rated)?)"
+               r"(?:\s*(?:and|or|&)\s*(?:above|more|up))?"),
+]
+# "top 5 laptops" asks for five rows, not a rating of 5
+TOP_N = re.compile(r"\b(top|best)\s+(\d+)\b")
+
+SORT_POPULAR = re.compile(
+    r"\bmost\s+(?:popular|reviewed|bought|sold|ratings)\b|\bbest[\s-]*sell(?:ing|ers?)\b|\bpopular(?:ity)?\b|\btrending\b"
+)
+SORT_RATING = re.compile(
+    r"\b(?:best|top|highly|highest|high|well)[\s-]*(?:rated|ratings?|reviewed)\b|\bgood (?:ratings?|reviews)\b|\bbest\b|\btop\b"
+)
+SORT_CHEAP = re.compile(r"\bcheap(?:est)?\b|\blow(?:est)? price[ds]?\b|\baffordable\b|\bbudget\b")
+
+# questions that need real reasoning, they always go to the LLM
+UNSUPPORTED = re.compile(
+    r"\b(?:vs|versus|compare|comparison|difference|differences|better|or|not|except|without|excluding|than)\b"
+)
+
+STOPWORDS = {
+    "a", "an", "the", "any", "some", "all", "of", "in", "on", "for", "with", "by", "to", "from", "and", "&",
+    "show", "me", "find", "search", "list", "display", "give", "provide", "get", "buy", "want", "need",
+    "looking", "look", "please", "can", "could", "you", "i", "my", "is", "are", "which", "what", "that",
+    "those", "these", "products", "product", "items", "item", "options", "price", "priced", "prices",
+    "cost", "costing", "range", "rs", "inr", "rupees", "good", "nice", "under", "below", "within",
+    "rating", "ratings", "rated", "reviews", "review", "stars", "star", "one", "ones", "available",
+    "called", "named", "brand", "brands", "sort", "sorted", "order", "ordered", "by",
+}
+
+# brand names that are also ordinary words, they are searched as keywords instead
+COMMON_WORD_BRANDS = {
+    "pro", "max", "basics", "guess", "killer", "analogue", "nothing", "fingers", "wings", "valley",
+    "aroma", "arrow", "chemistry", "liberty", "a k", "y i", "the l", "d k w",
+}
+
+MAX_KEYWORDS = 4
+
+_brands = None
+_lock = threading.Lock()
+
+counters = {"fast_path": 0, "llm": 0}
+
+
+def _normalize(text):
+    return " ".join(re.findall(r"[a-z0-9]+", text.lower()))
+
+
+def _amount(number, unit):
+    return int(round(float(number) * UNITS.get(unit or "", 1)))
+
+
+def known_brands():
+    global _brands
+    if _brands is None:
+        rows = db_pool.execute(
+            "SELECT DISTINCT LOWER(brand) AS brand FROM product WHERE brand IS NOT NULL", limit=None
+        )
+        brands = {}
+        for brand in (row["brand"] for row in rows):
+            key = _normalize(brand)
+            if key and key not in COMMON_WORD_BRANDS:
+                brands.setdefault(key, []).append(brand)
+        _brands = brands
+    return _brands
+
+
+def _cut(q, match):
+    return q[:match.start()] + " " + q[match.end():]
+
+
+def parse(question):
+    """Split a product question into filters and sort keys, None if the shape is not supported."""
+    q = " " + question.lower().replace(",", "") + " "
+    spec = {"brands": [], "keywords": [], "min_price": None, "max_price": None,
+            "min_rating": None, "sort": [], "limit": None}
+
+    match = RATING_OR_PRICE.search(q)
+    if match and not RATING_WORD_BEFORE.search(q[:match.start()]):
+        return None
+
+    match = TOP_N.search(q)
+    if match:
+        spec["limit"] = int(match.group(2))
+        if spec["limit"] == 0:
+            return None
+        q = q[:match.start()] + f" {match.group(1)} " + q[match.end():]
+
+    loose = False
+    for match in (m for pattern in RATING_MIN for m in pattern.finditer(q)):
+        # "rated 4" alone is too loose, a bare number needs a comparison or a unit with it
+        groups = match.groupdict()
+        if "cmp" in groups and not any(groups[k] for k in ("of", "cmp", "unit", "up")):
+            loose = True
+            continue
+        rating = float(match.group("value"))
+        if rating > 5:
+            return None
+        spec["min_rating"] = rating
+        q = _cut(q, match)
+        break
+    else:
+        if loose:
+            return None
+
+    match = PRICE_RANGE.search(q)
+    if match:
+        low = _amount(match.group(1), match.group(2) or match.group(4))
+        high = _amount(match.group(3), match.group(4))
+        if min(low, high) >= 100:
+            spec["min_price"], spec["max_price"] = sorted((low, high))
+            q = _cut(q, match)
+    for pattern, key in ((PRICE_MAX, "max_price"), (PRICE_MIN, "min_price")):
+        match = pattern.search(q)
+        if match and spec[key] is None:
+            amount = _amount(match.group(1), match.group(2))
+            if not (match.group(2) or CURRENCY.search(match.group(0)) or amount >= MIN_PRICE):
+                return None
+            spec[key] = amount
+            q = _cut(q, match)
+
+    # "₹5000 shoes" could mean under, around or exactly, leave it to the LLM
+    if BARE_PRICE.search(q):
+        return None
+
+    for pattern, key in ((SORT_POPULAR, "popularity"), (SORT_RATING, "rating"), (SORT_CHEAP, "price")):
+        match = pattern.search(q)
+        if match:
+            spec["sort"].append(key)
+            q = pattern.sub(" ", q)
+
+    if UNSUPPORTED.search(q):
+        return None
+
+    words = _normalize(q)
+    padded = f" {words} "
+    for brand in sorted(known_brands(), key=len, reverse=True):
+        if f" {brand} " in padded:
+            spec["brands"].extend(known_brands()[brand])
+            padded = padded.replace(f" {brand} ", " ")
+            break
+
+    spec["keywords"] = [w for w in padded.split() if w not in STOPWORDS]
+    if len(spec["keywords"]) > MAX_KEYWORDS:
+        return None
+
+    has_filter = (spec["brands"] or spec["keywords"] or spec["min_rating"] is not None
+                  or spec["min_price"] is not None or spec["max_price"] is not None)
+    if not has_filter and not spec["sort"]:
+        return None
+    return spec
+
+
+def build_sql(spec):
+    # rating order comes from the precomputed score, raw avg_rating puts 5.0 from 2 ratings first
+    ranked = "rating" in spec["sort"]
+    conditions, params = [], []
+    if spec["keywords"]:
+        rowid = "product_rowid" if ranked else "rowid"
+        conditions.append(f"{rowid} IN (SELECT rowid FROM product_fts WHERE product_fts MATCH ?)")
+        params.append(" AND ".join(f'"{word}"' for word in spec["keywords"]))
+    if spec["brands"]:
+        conditions.append(f"LOWER(brand) IN ({', '.join('?' * len(spec['brands']))})")
+        params.extend(spec["brands"])
+    if spec["min_price"] is not None:
+        conditions.append("price >= ?")
+        params.append(spec["min_price"])
+    if spec["max_price"] is not None:
+        conditions.append("price <= ?")
+        params.append(spec["max_price"])
+    if spec["min_rating"] is not None:
+        conditions.append("avg_rating >= ?")
+        params.append(spec["min_rating"])
+
+    order = []
+    for key in spec["sort"] or ["popularity"]:
+        if key == "rating":
+            order.append("score_rank ASC")
+        elif key == "popularity":
+            order += ["total_ratings DESC", "avg_rating DESC"]
+        elif key == "price":
+            order.append("price ASC")
+
+    sql = "SELECT * FROM product_ranked" if ranked else "SELECT * FROM product"
+    if conditions:
+        sql += " WHERE " + " AND ".join(conditions)
+    sql += " ORDER BY " + ", ".join(dict.fromkeys(order))
+    if spec["limit"] is not None:
+        sql += f" LIMIT {spec['limit']}"
+    return sql, tuple(params)
+
+
+def compile_query(question):
+    spec = parse(question)
+    if spec is None:
+        return None
+    return build_sql(spec)
+
+
+def record(fast_path):
+    with _lock:
+        counters["fast_path" if fast_path else "llm"] += 1
+
+
+def stats():
+    with _lock:
+        total = counters["fast_path"] + counters["llm"]
+        return {**counters, "fast_path_share": counters["fast_path"] / total if total else 0.0}
+
+
+if __name__ == "__main__":
+    for question in [
+        "provide iphone under 1 lakh?",
+        "Find laptops below 80k?",
+        "Which is the best rated shoes?",
+        "Nike shoes below 5000",
+        "top rated mobiles under 20000",
+        "shoes in price range 5000 to 1000",
+        "samsung phones with rating above 4 sorted by popularity",
+        "compare iphone 13 and iphone 14",
+        "top 5 rated laptops",
+        "show me top 3 laptops",
+        "laptops rated above 4",
+        "4.5 star shoes",
+        "phones above 4 rating",
+        "tv above 4 star",
+        "shoes under 5",
+        "shoes under rs 99",
+        "watches above 2k",
+    ]:
+        print(question, "->", compile_query(question))
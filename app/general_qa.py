@@ -1,135 +1,108 @@
-import pandas as pd
-import chromadb
 from pathlib import Path
-from chromadb.utils import embedding_functions
 from dotenv import load_dotenv
-from groq import Groq
-import os
+import asyncio
+
+import aio
+import llm_gateway
+import models
+import prompt_builder
+import streaming
+import telemetry
+import vector_store
 
 load_dotenv()
 
 general_qa_path = Path(__file__).parent/"resources/ecommerce_chatbot_qna.csv"
-chroma_client = chromadb.Client()
 collections_name = "general_qa_client"
-groq = Groq()
-
-
-ef = embedding_functions.SentenceTransformerEmbeddingFunction(
-    model_name='sentence-transformers/all-MiniLM-L6-v2',
-)
 
-convo_summary = ""
-recent_chats = []
 
-Max_Chat_Size = 4
-Summary_trigger = 8
+ef = models.embedding_function()
 
 def general_data_ingest(path):
-    if collections_name not in [collection.name for collection in chroma_client.list_collections()]:
-        print("Loading data to Chroma database")
-        collections = chroma_client.get_or_create_collection(
-            name=collections_name,
-            embedding_function=ef,
-        )
-
-        df = pd.read_csv(general_qa_path)
-        docs = df['question'].tolist()
-        metadata = [{"answer" : data} for data in df['answer'].tolist()]
-
-        ids = [f"id_{i}" for i in range(len(docs))]
-
-        collections.add(
-            documents = docs,
-            metadatas= metadata,
-            ids=ids,
-        )
-        print("Loaded data successfully")
-    else:
-        print(f"Collection -> {collections_name} already exist")
+    vector_store.sync_csv(collections_name, path, ef)
 
 def query_relevant_answ(query):
-    collection = chroma_client.get_collection(
-        name=collections_name,
-        embedding_function=ef,
-    )
-
-    result = collection.query(
-        query_texts=query,
-        n_results=2,
-    )
-    return result
+    return vector_store.query(collections_name, ef, [query], n_results=2)
 
-def summary_generation(recent_mgs):
+async def asummary_generation(recent_mgs):
     prompt = f'''
     generate the summary for this below conversations.
     keep only key facts and user intent:
     {recent_mgs}
     '''
-    chat_completion = groq.chat.completions.create(
+    chat_completion = await llm_gateway.complete(
         messages=[
             {
                 "role": "user",
                 "content": prompt,
             }
         ],
-        model="llama-3.3-70b-versatile",
+        model=llm_gateway.BIG_MODEL,
+        priority=llm_gateway.BACKGROUND,
     )
     return chat_completion.choices[0].message.content
 
-def general_qa_chain(query):
-    global convo_summary,recent_chats
-    queried_answers = query_relevant_answ(query)
+async def ageneral_qa_chain_stream(query, queried_answers=None, summary="", recent_msgs=()):
+    if queried_answers is None:
+        with telemetry.span("retrieval", route="general_qa"):
+            queried_answers = await asyncio.to_thread(query_relevant_answ, query)
     context = " ".join(answ.get('answer') for answ in queried_answers['metadatas'][0])
-    answer = generate_answer(
+    async for token in agenerate_answer_stream(
         query,
         context,
-        summary=convo_summary,
-        chat_history = "\n".join(recent_chats)
-    )
-
-    recent_chats.append(f"user : {query}")
-    recent_chats.append(f"assistant : {answer}")
+        summary=summary,
+        recent_msgs=recent_msgs
+    ):
+        yield token
 
-    if len(recent_chats) > Summary_trigger:
-        summary = summary_generation(recent_chats)
-        convo_summary = convo_summary + "\n" + summary
-        recent_chats = recent_chats[-Max_Chat_Size*2:]
+async def ageneral_qa_chain(query, queried_answers=None, summary="", recent_msgs=()):
+    return await streaming.collect(ageneral_qa_chain_stream(query, queried_answers, summary, recent_msgs))
 
-    return answer
-
-def generate_answer(query,context,summary,chat_history):
-    prompt = f'''
+async def agenerate_answer_stream(query,context,summary="",recent_msgs=()):
+    instructions = '''
     Given the following context, question, summary of previous chats and chat history , generate answer based on these elements only.
     If the answer is not found in the context, kindly state "I don't know". Don't try to make up an answer.
-    
-    summary of previous convertion:
-    {summary}
-    
-    chat history:
-    {chat_history}
-    
-    Question:
-    {query}
-    
-    Context:
-    {context}
     '''
-    chat_completion = groq.chat.completions.create(
-        messages=[
-            {
-                "role": "user",
-                "content": prompt,
-            }
-        ],
-        model=os.environ['GROQ_FAST'],
+    model = llm_gateway.FAST_MODEL
+    messages, estimated = await asyncio.to_thread(
+        prompt_builder.build,
+        instructions,
+        f"Question:\n{query}\n\nContext:\n{context}",
+        model=model,
+        query=query,
+        summary=summary,
+        recent_msgs=recent_msgs,
     )
+    usage = []
+    async for token in llm_gateway.stream(
+        on_usage=usage.append,
+        messages=messages,
+        model=model,
+    ):
+        yield token
+    prompt_builder.record("general_qa_answer", estimated, usage[-1] if usage else None)
+
+async def agenerate_answer(query,context,summary="",recent_msgs=()):
+    return await streaming.collect(agenerate_answer_stream(query,context,summary,recent_msgs))
+
+# blocking wrappers for callers outside the event loop
+def summary_generation(recent_mgs):
+    return aio.run(asummary_generation(recent_mgs))
 
-    return chat_completion.choices[0].message.content
+def general_qa_chain(query, summary="", recent_msgs=()):
+    return aio.run(ageneral_qa_chain(query, summary=summary, recent_msgs=recent_msgs))
+
+def general_qa_chain_stream(query, summary="", recent_msgs=()):
+    return streaming.iterate(ageneral_qa_chain_stream(query, summary=summary, recent_msgs=recent_msgs))
+
+def generate_answer(query,context,summary="",recent_msgs=()):
+    return aio.run(agenerate_answer(query,context,summary,recent_msgs))
 
 if __name__ == "__main__":
     general_data_ingest(general_qa_path)
     query1 = "what is your role"
-    print(general_qa_chain(query1))
+    answer1 = general_qa_chain(query1)
+    print(answer1)
 
     query2 = "what was my previous conversation"
-    print(general_qa_chain(query2))
+    print(general_qa_chain(query2, recent_msgs=[f"User: {query1}", f"Assistant: {answer1}"]))
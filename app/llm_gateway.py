@@ -0,0 +1,369 @@
+import asyncio
+import heapq
+import itertools
+import os
+import random
+import time
+from collections import deque
+
+import groq
+from dotenv import load_dotenv
+
+import prompt_builder
+import streaming
+import telemetry
+
+
+load_dotenv()
+
+INTERACTIVE = 0
+BACKGROUND = 1
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BACKGROUND: "background"}
+
+
+def _pairs(text):
+    for part in filter(None, (p.strip() for p in text.split(","))):
+        key, _, value = part.partition("=")
+        yield key.strip(), value.strip()
+
+
+def _parse_limits(text):
+    limits = {}
+    for model, values in _pairs(text):
+        rpm, _, tpm = values.partition(":")
+        limits[model] = (float(rpm), float(tpm))
+    return limits
+
+
+BIG_MODEL = os.environ.get("GROQ_MODEL", "llama-3.3-70b-versatile")
+FAST_MODEL = os.environ.get("GROQ_FAST", "llama-3.1-8b-instant")
+
+
+# requests and tokens per minute, per model, "model=rpm:tpm,..." overrides the defaults.
+# 0 is no limit, the default. The buckets are per process, processes sharing one Groq
+# account each need their share of its quota here
+DEFAULT_RPM = float(os.environ.get("LLM_RPM", 0))
+DEFAULT_TPM = float(os.environ.get("LLM_TPM", 0))
+MODEL_LIMITS = _parse_limits(os.environ.get("LLM_MODEL_LIMITS", ""))
+# completion tokens reserved for a call that sets no max_tokens, corrected once usage comes back
+COMPLETION_ESTIMATE = int(os.environ.get("LLM_COMPLETION_ESTIMATE", 300))
+# calls waiting per model, and the longest wait for a slot before giving up
+MAX_QUEUE = int(os.environ.get("LLM_MAX_QUEUE", 64))
+MAX_WAIT = {
+    INTERACTIVE: float(os.environ.get("LLM_MAX_WAIT", 20)),
+    BACKGROUND: float(os.environ.get("LLM_MAX_WAIT_BACKGROUND", 120)),
+}
+RETRIES = int(os.environ.get("LLM_RETRIES", 3))
+BACKOFF = float(os.environ.get("LLM_BACKOFF", 0.5))
+BACKOFF_MAX = float(os.environ.get("LLM_BACKOFF_MAX", 8))
+
+# time to first token each route aims for, in seconds. A route answered by the big model
+# falls back to the fast one while the big one is expected to miss it.
+LATENCY_TARGETS = {route: float(v) for route, v in _pairs(
+    os.environ.get("LLM_LATENCY_TARGETS", "sql=2.0,general_qa=1.5,faq=1.0,fallback=1.5"))}
+TIER_PERCENTILE = float(os.environ.get("LLM_TIER_PERCENTILE", 0.9))
+# latencies older than this are forgotten, so a model that was slow gets another chance
+LATENCY_WINDOW = float(os.environ.get("LLM_LATENCY_WINDOW", 60))
+MIN_SAMPLES = int(os.environ.get("LLM_MIN_SAMPLES", 5))
+# hedging: a call that opts in gets a duplicate once it runs past this percentile of its
+# recent latencies, or past HEDGE_DELAY seconds until there are enough of them
+HEDGE = os.environ.get("LLM_HEDGE", "0").lower() in ("1", "true", "yes", "on")
+HEDGE_PERCENTILE = float(os.environ.get("LLM_HEDGE_PERCENTILE", 0.95))
+HEDGE_DELAY = float(os.environ.get("LLM_HEDGE_DELAY", 1.0))
+
+RETRYABLE = (groq.RateLimitError, groq.APITimeoutError, groq.APIConnectionError, groq.InternalServerError)
+
+# the gateway retries itself, with the rate limits in view
+client = groq.AsyncGroq(max_retries=0)
+
+_models = {}
+_seq = itertools.count()
+# (model, "ttft" or "complete") -> (time, seconds) of recent calls
+_latencies = {}
+
+counters = {"requests": 0, "retries": 0, "rejected": 0, "failed": 0, "wait_s": 0.0,
+            "tier_fallbacks": 0, "hedged": 0, "hedge_wins": 0}
+
+
+class Overloaded(TimeoutError):
+    """No slot for an LLM call: the queue is full or the wait ran past its limit."""
+
+
+class TokenBucket:
+    def __init__(self, per_minute):
+        self.capacity = per_minute
+        self.rate = per_minute / 60
+        self.level = per_minute
+        self.stamp = time.monotonic()
+
+    def _refill(self, now):
+        self.level = min(self.capacity, self.level + (now - self.stamp) * self.rate)
+        self.stamp = now
+
+    def wait(self, amount, now):
+        """Seconds until `amount` is available, a call larger than the bucket waits for a full one."""
+        if self.capacity <= 0:
+            return 0.0
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        return 0.0 if self.level >= amount else (amount - self.level) / self.rate
+
+    def take(self, amount, now):
+        self._refill(now)
+        self.level -= amount
+
+
+class _Model:
+    def __init__(self, name):
+        rpm, tpm = MODEL_LIMITS.get(name, (DEFAULT_RPM, DEFAULT_TPM))
+        self.name = name
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        # (priority, arrival, tokens, future), interactive calls go first
+        self.waiters = []
+        self.paused_until = 0.0
+        self.timer = None
+
+
+def _model(name):
+    model = _models.get(name)
+    if model is None:
+        model = _models[name] = _Model(name)
+    return model
+
+
+def _pump(model):
+    """Grant slots to waiting calls in priority order while the buckets allow."""
+    if model.timer is not None:
+        model.timer.cancel()
+        model.timer = None
+    now = time.monotonic()
+    while model.waiters:
+        _, _, tokens, future = model.waiters[0]
+        if future.done():
+            heapq.heappop(model.waiters)
+            continue
+        delay = max(model.paused_until - now, model.requests.wait(1, now), model.tokens.wait(tokens, now))
+        if delay > 0:
+            model.timer = asyncio.get_running_loop().call_later(delay, _pump, model)
+            break
+        heapq.heappop(model.waiters)
+        model.requests.take(1, now)
+        model.tokens.take(tokens, now)
+        future.set_result(None)
+    telemetry.gauge("llm_queue_depth", len(model.waiters), model=model.name)
+
+
+async def _acquire(name, tokens, priority):
+    model = _model(name)
+    labels = {"model": name, "priority": PRIORITY_NAMES[priority]}
+    if sum(not future.done() for *_, future in model.waiters) >= MAX_QUEUE:
+        counters["rejected"] += 1
+        telemetry.count("llm_rejected_total", reason="queue_full", **labels)
+        raise Overloaded(f"{name}: {MAX_QUEUE} calls already waiting")
+
+    future = asyncio.get_running_loop().create_future()
+    heapq.heappush(model.waiters, (priority, next(_seq), tokens, future))
+    start = time.monotonic()
+    _pump(model)
+    try:
+        await asyncio.wait_for(future, MAX_WAIT[priority])
+    except asyncio.TimeoutError:
+        counters["rejected"] += 1
+        telemetry.count("llm_rejected_total", reason="wait_timeout", **labels)
+        raise Overloaded(f"{name}: no slot within {MAX_WAIT[priority]}s") from None
+    finally:
+        # a timed out or cancelled head must not hold up the calls behind it
+        if future.cancelled():
+            _pump(model)
+    waited = time.monotonic() - start
+    counters["requests"] += 1
+    counters["wait_s"] += waited
+    telemetry.observe("llm_queue_wait_seconds", waited, **labels)
+
+
+def _retry_after(error):
+    response = getattr(error, "response", None)
+    try:
+        return float(response.headers.get("retry-after"))
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+
+async def _backoff(name, error, attempt):
+    """Wait before another attempt, a retry-after from the provider pauses the whole model."""
+    model = _model(name)
+    retry_after = _retry_after(error)
+    if retry_after is not None:
+        model.paused_until = max(model.paused_until, time.monotonic() + retry_after)
+        _pump(model)
+    counters["retries"] += 1
+    telemetry.count("llm_retries_total", model=name, error=type(error).__name__)
+    print(f"[{name}] {type(error).__name__}, retry {attempt + 1}/{RETRIES}"
+          + (f" after {retry_after}s" if retry_after is not None else ""))
+    await asyncio.sleep(random.uniform(0, min(BACKOFF_MAX, BACKOFF * 2 ** attempt)))
+
+
+def _estimate(messages, kwargs):
+    prompt = sum(prompt_builder.count_tokens(str(m.get("content", ""))) for m in messages)
+    return prompt + (kwargs.get("max_tokens") or COMPLETION_ESTIMATE)
+
+
+def _settle(name, estimated, usage):
+    """Charge the token bucket what the call really used instead of the estimate."""
+    total = getattr(usage, "total_tokens", None)
+    if total is None:
+        return
+    model = _model(name)
+    model.tokens.level -= total - estimated
+    if total < estimated:
+        _pump(model)
+
+
+def _observe(model, kind, seconds):
+    samples = _latencies.get((model, kind))
+    if samples is None:
+        samples = _latencies[(model, kind)] = deque(maxlen=200)
+    samples.append((time.monotonic(), seconds))
+
+
+def latency(model, kind, q):
+    """The `q` quantile of the recent latencies of `model`, None with too few of them."""
+    samples = _latencies.get((model, kind))
+    if not samples:
+        return None
+    cutoff = time.monotonic() - LATENCY_WINDOW
+    while samples and samples[0][0] < cutoff:
+        samples.popleft()
+    if len(samples) < MIN_SAMPLES:
+        return None
+    values = sorted(seconds for _, seconds in samples)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def _expected_ttft(name):
+    model = _model(name)
+    now = time.monotonic()
+    queued = max(model.paused_until - now, model.requests.wait(1, now))
+    return (latency(name, "ttft", TIER_PERCENTILE) or 0.0) + queued
+
+
+def pick_model(route, model=None):
+    """The model to answer `route` with, `model` (the big one) unless it is too slow right now.
+
+    Slow means its recent time to first token plus the wait for a rate limit slot is over
+    the latency target of the route, and the fast model is expected to do better.
+    """
+    model = model or BIG_MODEL
+    target = LATENCY_TARGETS.get(route)
+    if target is None or model == FAST_MODEL:
+        return model
+    expected = _expected_ttft(model)
+    if expected <= target or _expected_ttft(FAST_MODEL) >= expected:
+        return model
+    counters["tier_fallbacks"] += 1
+    telemetry.count("llm_tier_fallbacks_total", route=route, model=model)
+    return FAST_MODEL
+
+
+def _failed(name, error):
+    counters["failed"] += 1
+    telemetry.count("llm_failures_total", model=name, error=type(error).__name__)
+
+
+async def _complete(messages, model, priority, kwargs):
+    estimated = _estimate(messages, kwargs)
+    for attempt in range(RETRIES + 1):
+        await _acquire(model, estimated, priority)
+        start = time.monotonic()
+        try:
+            completion = await client.chat.completions.create(messages=messages, model=model, **kwargs)
+        except RETRYABLE as e:
+            if attempt == RETRIES:
+                _failed(model, e)
+                raise
+            await _backoff(model, e, attempt)
+            continue
+        elapsed = time.monotonic() - start
+        _observe(model, "complete", elapsed)
+        telemetry.observe("llm_complete_seconds", elapsed, model=model)
+        _settle(model, estimated, completion.usage)
+        return completion
+
+
+async def complete(messages, model, priority=INTERACTIVE, hedge=False, **kwargs):
+    """A chat completion, queued behind the rate limits of `model` and retried.
+
+    With `hedge` (and LLM_HEDGE on) a slow call gets a duplicate, the first answer wins
+    and the other call is cancelled. Meant for short calls, the duplicate costs quota.
+    """
+    if not (hedge and HEDGE):
+        return await _complete(messages, model, priority, kwargs)
+
+    first = asyncio.ensure_future(_complete(messages, model, priority, kwargs))
+    delay = latency(model, "complete", HEDGE_PERCENTILE) or HEDGE_DELAY
+    done, _ = await asyncio.wait({first}, timeout=delay)
+    if done:
+        return first.result()
+
+    counters["hedged"] += 1
+    telemetry.count("llm_hedged_total", model=model)
+    second = asyncio.ensure_future(_complete(messages, model, priority, kwargs))
+    pending = {first, second}
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    if task is second:
+                        counters["hedge_wins"] += 1
+                        telemetry.count("llm_hedge_wins_total", model=model)
+                    return task.result()
+        raise first.exception()
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+async def stream(messages, model, priority=INTERACTIVE, on_usage=None, **kwargs):
+    """The content deltas of a streamed completion, see complete.
+
+    A failed call is retried only while none of its tokens went out.
+    """
+    estimated = _estimate(messages, kwargs)
+    for attempt in range(RETRIES + 1):
+        await _acquire(model, estimated, priority)
+        start = time.monotonic()
+        usage = []
+        started = False
+        try:
+            async for token in streaming.stream_completion(
+                client, on_usage=usage.append, messages=messages, model=model, **kwargs
+            ):
+                if not started:
+                    started = True
+                    _observe(model, "ttft", time.monotonic() - start)
+                yield token
+        except RETRYABLE as e:
+            if started or attempt == RETRIES:
+                _failed(model, e)
+                raise
+            await _backoff(model, e, attempt)
+            continue
+        if usage:
+            _settle(model, estimated, usage[-1])
+            if on_usage is not None:
+                on_usage(usage[-1])
+        return
+
+
+def limits():
+    return {"rpm": DEFAULT_RPM, "tpm": DEFAULT_TPM, "models": {m: list(v) for m, v in MODEL_LIMITS.items()}}
+
+
+def stats():
+    return {
+        **counters,
+        "wait_s": round(counters["wait_s"], 3),
+        "queued": sum(not w[3].done() for model in list(_models.values()) for w in list(model.waiters)),
+    }
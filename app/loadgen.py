@@ -0,0 +1,286 @@
+"""Load generator, concurrent shopping sessions against the chat engine.
+
+Every session replays multi-turn conversations drawn from the FAQ, general QA and
+benchmark query files, with follow-ups like "show more" and "thanks", and waits a
+random think time between turns. The engine runs in this process with the Groq calls
+answered by stub_llm, or a running chat API is driven with --url:
+
+    python loadgen.py --sessions 1,8,32,64 --duration 60 --mix faq=3,sql=4,general_qa=2,fallback=1
+
+Each level of --sessions runs for --duration seconds and reports throughput, latency
+percentiles, error rate and memory, also every --interval seconds while it runs.
+"""
+import argparse
+import csv
+import gc
+import json
+import os
+import random
+import threading
+import time
+import tracemalloc
+from collections import defaultdict
+from pathlib import Path
+
+import benchmark
+import stub_llm
+
+
+resources = Path(__file__).parent / "resources"
+
+DEFAULT_MIX = {"faq": 3, "sql": 4, "general_qa": 2, "fallback": 1}
+FOLLOW_UPS = {"sql": ["show more", "more"]}
+CLOSINGS = ["thanks", "thank you", "thx"]
+# every failure reply of the engine and of chat_client carries it, also after a partial answer
+ERROR_MARK = "⚠️"
+
+
+def _questions(path, column="question"):
+    with open(path, newline="") as f:
+        return [row[column] for row in csv.DictReader(f) if row.get(column)]
+
+
+def load_queries():
+    """Queries per route, the faq and general_qa ones straight from their datasets."""
+    queries = defaultdict(list)
+    for query, route in benchmark.load_corpus():
+        queries[route].append(query)
+    queries["faq"] += _questions(resources / "faq_data.csv")
+    queries["general_qa"] += _questions(resources / "ecommerce_chatbot_qna.csv")
+    return {route: sorted(set(items)) for route, items in queries.items()}
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(","):
+        route, _, weight = part.partition("=")
+        mix[route.strip()] = float(weight or 1)
+    return mix
+
+
+def conversation(queries, mix, rng, turns=(2, 5)):
+    """One shopper's turns, each a (route, query) pair."""
+    routes = [route for route in mix if queries.get(route)]
+    weights = [mix[route] for route in routes]
+    out = []
+    for _ in range(rng.randint(*turns)):
+        route = rng.choices(routes, weights)[0]
+        out.append((route, rng.choice(queries[route])))
+        if route in FOLLOW_UPS and rng.random() < 0.3:
+            out.append((f"{route}_more", rng.choice(FOLLOW_UPS[route])))
+    if rng.random() < 0.5:
+        out.append(("thanks", rng.choice(CLOSINGS)))
+    return out
+
+
+def rss_mb():
+    """Resident memory of this process, from /proc where there is one."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class Recorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.turns = []
+
+    def add(self, **turn):
+        with self.lock:
+            self.turns.append(turn)
+
+    def since(self, start):
+        with self.lock:
+            return [t for t in self.turns if t["end"] >= start]
+
+
+def summarize(turns, seconds):
+    latencies = [t["ms"] for t in turns]
+    ttfts = [t["ttft_ms"] for t in turns if t["ttft_ms"] is not None]
+    errors = sum(t["error"] for t in turns)
+    return {
+        "turns": len(turns),
+        "throughput": round(len(turns) / seconds, 2) if seconds else 0.0,
+        "error_rate": round(errors / len(turns), 4) if turns else 0.0,
+        "latency_ms": benchmark.percentiles(latencies),
+        "ttft_ms": benchmark.percentiles(ttfts),
+    }
+
+
+def _session(stream, queries, mix, think, deadline, recorder, rng):
+    session_id = f"load-{rng.getrandbits(48):012x}"
+    while time.perf_counter() < deadline:
+        for route, query in conversation(queries, mix, rng):
+            if time.perf_counter() >= deadline:
+                return
+            start = time.perf_counter()
+            first = None
+            text = []
+            failed = False
+            try:
+                for chunk in stream(session_id, query):
+                    if first is None:
+                        first = (time.perf_counter() - start) * 1000
+                    text.append(chunk)
+                failed = ERROR_MARK in "".join(text)
+            except Exception as e:
+                print(f"[{session_id}] {type(e).__name__}: {e}")
+                failed = True
+            end = time.perf_counter()
+            recorder.add(route=route, ms=(end - start) * 1000, ttft_ms=first, error=failed, end=end)
+            time.sleep(rng.expovariate(1 / think) if think else 0)
+        # a new shopper takes over the slot
+        session_id = f"load-{rng.getrandbits(48):012x}"
+
+
+def run_level(stream, queries, mix, sessions, duration, think, interval, seed=0, report=print):
+    recorder = Recorder()
+    start = time.perf_counter()
+    deadline = start + duration
+    threads = [
+        threading.Thread(
+            target=_session,
+            args=(stream, queries, mix, think, deadline, recorder, random.Random(seed * 100003 + i)),
+            daemon=True,
+        )
+        for i in range(sessions)
+    ]
+    for thread in threads:
+        thread.start()
+
+    timeline = []
+    tick = start
+    while any(thread.is_alive() for thread in threads):
+        time.sleep(0.2)
+        now = time.perf_counter()
+        if now - tick < interval and any(thread.is_alive() for thread in threads):
+            continue
+        window = summarize(recorder.since(tick), now - tick)
+        point = {"t": round(now - start, 1), "rss_mb": round(rss_mb(), 1), **window}
+        if tracemalloc.is_tracing():
+            point["traced_mb"] = round(tracemalloc.get_traced_memory()[0] / 2**20, 1)
+        point.update(report_state())
+        timeline.append(point)
+        p = window["latency_ms"] or {}
+        report(f"  t={point['t']:>6.1f}s  {window['throughput']:>6.2f} turns/s  p50 {p.get('p50', 0):>8.1f}"
+               f"  p95 {p.get('p95', 0):>8.1f} ms  errors {window['error_rate']:.1%}  rss {point['rss_mb']} MB")
+        tick = now
+
+    elapsed = time.perf_counter() - start
+    turns = recorder.since(start)
+    by_route = defaultdict(list)
+    for turn in turns:
+        by_route[turn["route"]].append(turn)
+    return {
+        "sessions": sessions,
+        "seconds": round(elapsed, 1),
+        **summarize(turns, elapsed),
+        "routes": {route: summarize(items, elapsed) for route, items in sorted(by_route.items())},
+        "timeline": timeline,
+    }
+
+
+def report_state():
+    """Sizes of the in-process state that grows with sessions, empty against --url."""
+    if os.environ.get("CHAT_API_URL"):
+        return {}
+    import cache
+    import memory
+    import summarizer
+    sessions = memory.stats()
+    return {
+        "memory_sessions": sessions["sessions"],
+        "memory_bytes": sessions["bytes"],
+        "summary_backlog": summarizer.stats()["pending_sessions"],
+        "answer_cache": cache.stats()["entries"],
+    }
+
+
+def leak_check(timeline):
+    """RSS growth per minute over the second half of a level, after warm-up."""
+    points = timeline[len(timeline) // 2:]
+    if len(points) < 2 or points[-1]["t"] == points[0]["t"]:
+        return None
+    return round((points[-1]["rss_mb"] - points[0]["rss_mb"]) / (points[-1]["t"] - points[0]["t"]) * 60, 2)
+
+
+def main(args):
+    if args.url:
+        os.environ["CHAT_API_URL"] = args.url
+    else:
+        stub_llm.TAIL_RATE = args.tail_rate
+        server = stub_llm.start()
+        os.environ["GROQ_BASE_URL"] = server.base_url
+        os.environ["GROQ_API_KEY"] = "stub"
+        os.environ.setdefault("GROQ_MODEL", "llama-3.3-70b-versatile")
+        os.environ.setdefault("GROQ_FAST", "llama-3.1-8b-instant")
+        # the stub has no quota, gateway buckets would only time their own waits
+        os.environ.update(LLM_RPM="0", LLM_TPM="0", LLM_MODEL_LIMITS="")
+
+    # imported once the stub is up, llm_gateway creates its Groq client on import
+    import chat_client
+    chat_client.prepare()
+    llm_limits = None
+    if not args.url:
+        import llm_gateway
+        llm_limits = llm_gateway.limits()
+
+    if args.tracemalloc:
+        tracemalloc.start()
+
+    queries = load_queries()
+    mix = parse_mix(args.mix)
+    levels = []
+    for sessions in args.sessions:
+        print(f"{sessions} sessions for {args.duration}s, think time {args.think}s")
+        level = run_level(chat_client.stream, queries, mix, sessions, args.duration, args.think,
+                          args.interval, seed=args.seed)
+        level["rss_growth_mb_per_min"] = leak_check(level["timeline"])
+        levels.append(level)
+        gc.collect()
+
+    print(f"\n{'sessions':>8} {'turns/s':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'errors':>7} {'rss MB/min':>10}")
+    for level in levels:
+        p = level["latency_ms"] or {}
+        print(f"{level['sessions']:>8} {level['throughput']:>8.2f} {p.get('p50', 0):>8.1f} {p.get('p95', 0):>8.1f}"
+              f" {p.get('p99', 0):>8.1f} {level['error_rate']:>7.1%} {level['rss_growth_mb_per_min'] or 0:>10.2f}")
+
+    # saturation: the first level that gains under 10% throughput over the one before
+    for before, after in zip(levels, levels[1:]):
+        if before["throughput"] and after["throughput"] < before["throughput"] * 1.1:
+            print(f"throughput saturates around {before['sessions']} sessions")
+            break
+
+    result = {
+        "commit": benchmark._commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": {**{k: v for k, v in vars(args).items() if k != "out"}, "mix": mix,
+                   "llm_limits": llm_limits},
+        "levels": levels,
+    }
+    out = args.out or benchmark.results_dir / f"load-{result['commit']}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(result, indent=2, default=str))
+    print(f"saved {out}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=lambda s: [int(n) for n in s.split(",")], default=[1, 4, 16])
+    parser.add_argument("--duration", type=float, default=30, help="seconds per level")
+    parser.add_argument("--think", type=float, default=1.0, help="mean seconds between turns")
+    parser.add_argument("--mix", default=",".join(f"{k}={v}" for k, v in DEFAULT_MIX.items()))
+    parser.add_argument("--interval", type=float, default=5, help="seconds between progress lines")
+    parser.add_argument("--tail-rate", type=float, default=stub_llm.TAIL_RATE or 0.02,
+                        help="share of stub LLM calls that hit the slow tail")
+    parser.add_argument("--url", help="drive a running chat API instead of an in-process engine")
+    parser.add_argument("--tracemalloc", action="store_true", help="also track Python heap size")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", type=Path, help="defaults to bench_results/load-<commit>.json")
+    main(parser.parse_args())
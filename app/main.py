@@ -1,13 +1,7 @@
 import streamlit as st
-from pathlib import Path
-import importlib
-import re
+import uuid
 
-import router
-import faq
-import sql
-import general_qa
-import fallback_qa
+import chat_client
 
 st.set_page_config(
     page_title="E-Commerce AI Assistant",
@@ -15,21 +9,7 @@ st.set_page_config(
     layout="centered"
 )
 
-if "modules_loaded" not in st.session_state:
-    importlib.reload(faq)
-    importlib.reload(sql)
-    importlib.reload(general_qa)
-    importlib.reload(fallback_qa)
-    st.session_state.modules_loaded = True
-
-if "data_loaded" not in st.session_state:
-    faq_path = Path(__file__).parent / "resources/faq_data.csv"
-    general_qa_path = Path(__file__).parent / "resources/ecommerce_chatbot_qna.csv"
-
-    faq.ingest_faq_data(faq_path)
-    general_qa.general_data_ingest(general_qa_path)
-
-    st.session_state.data_loaded = True
+chat_client.prepare()
 
 if "messages" not in st.session_state:
     st.session_state.messages = [
@@ -39,27 +19,8 @@ if "messages" not in st.session_state:
         }
     ]
 
-if "summary" not in st.session_state:
-    st.session_state.summary = ""
-
-if "recent_messages" not in st.session_state:
-    st.session_state.recent_messages = []
-
-def force_sql(query: str) -> bool:
-    q = query.lower()
-
-    price_pattern = r"(under|below|less than)\s*\d+(\s?k)?|\brs\.?\s*\d+|\b₹\s*\d+"
-
-    keywords = [
-        "rated", "rating", "ratings", "reviews", "popular",
-        "top rated", "best rated",
-        "show me", "find", "list", "give me", "provide me"
-    ]
-
-    return (
-        re.search(price_pattern, q) is not None
-        or any(k in q for k in keywords)
-    )
+if "session_id" not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
 
 st.markdown(
     """
@@ -114,59 +75,8 @@ if query:
         {"role": "user", "content": query}
     )
 
-    q_clean = query.lower().strip()
-
-    try:
-        if q_clean in {"thanks", "thank you", "ya thank you", "thx"}:
-            answer = "😊 You're welcome! Let me know if you need help shopping."
-
-        else:
-            # ROUTING
-            route_obj = router.router(query)
-
-            if force_sql(query):
-                route = "sql"
-            elif route_obj is None:
-                route = None
-            else:
-                route = route_obj.name
-
-            # RESPONSE
-            if route is None:
-                answer = "I can't assist you with that"
-
-            elif route == "faq":
-                answer, new_summary, new_recent = fallback_qa.fallback_chain(
-                    query=query,
-                    summary=st.session_state.summary,
-                    recent_msgs=st.session_state.recent_messages
-                )
-                st.session_state.summary = new_summary
-                st.session_state.recent_messages = new_recent
-
-            elif route == "sql":
-                answer = sql.sql_chain(query)
-
-            elif route == "general_qa":
-                answer = general_qa.general_qa_chain(query)
-
-            else:
-                answer, new_summary, new_recent = fallback_qa.fallback_chain(
-                    query=query,
-                    summary=st.session_state.summary,
-                    recent_msgs=st.session_state.recent_messages
-                )
-                st.session_state.summary = new_summary
-                st.session_state.recent_messages = new_recent
-
-    except Exception:
-        answer = (
-            "⚠️ I’m temporarily unavailable due to high traffic or system load. "
-            "Please try again in a few minutes."
-        )
-
     with st.chat_message("assistant"):
-        st.markdown(answer)
+        answer = st.write_stream(chat_client.stream(st.session_state.session_id, query))
 
     st.session_state.messages.append(
         {"role": "assistant", "content": answer}
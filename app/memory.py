@@ -0,0 +1,123 @@
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+
+import summarizer
+
+
+# turns kept verbatim per session, older turns are folded into the summary
+MAX_TURNS = int(os.environ.get("MEMORY_MAX_TURNS", 4))
+MESSAGE_CHARS = int(os.environ.get("MEMORY_MESSAGE_CHARS", 1500))
+SUMMARY_CHARS = int(os.environ.get("MEMORY_SUMMARY_CHARS", 2000))
+MAX_SESSIONS = int(os.environ.get("MEMORY_MAX_SESSIONS", 1000))
+IDLE_TTL = int(os.environ.get("MEMORY_IDLE_TTL", 3600))
+MAX_BYTES = int(os.environ.get("MEMORY_MAX_BYTES", 32 * 1024 * 1024))
+
+# session id -> {"summary", "turns", "touched", "size"}, least recently used first
+_sessions = OrderedDict()
+_lock = threading.Lock()
+_bytes = 0
+
+counters = {"sessions_created": 0, "evicted_idle": 0, "evicted_lru": 0, "summary_trimmed": 0}
+
+
+def _size(entry):
+    return len(entry["summary"].encode()) + sum(
+        len(user.encode()) + len(assistant.encode()) for user, assistant in entry["turns"]
+    )
+
+
+def _cap_summary(summary):
+    if len(summary) <= SUMMARY_CHARS:
+        return summary
+    counters["summary_trimmed"] += 1
+    # the newest summaries are at the end, drop whole lines from the front
+    summary = summary[-SUMMARY_CHARS:]
+    newline = summary.find("\n")
+    return summary[newline + 1:] if newline != -1 else summary
+
+
+def _drop(session_id):
+    global _bytes
+    entry = _sessions.pop(session_id)
+    _bytes -= entry["size"]
+    summarizer.discard(session_id)
+
+
+def _evict(now):
+    expired = [sid for sid, entry in _sessions.items() if now - entry["touched"] > IDLE_TTL]
+    for sid in expired:
+        _drop(sid)
+        counters["evicted_idle"] += 1
+    while _sessions and (len(_sessions) > MAX_SESSIONS or _bytes > MAX_BYTES):
+        _drop(next(iter(_sessions)))
+        counters["evicted_lru"] += 1
+
+
+def _resize(entry):
+    global _bytes
+    size = _size(entry)
+    _bytes += size - entry["size"]
+    entry["size"] = size
+
+
+def _entry(session_id, now):
+    entry = _sessions.get(session_id)
+    if entry is None:
+        entry = {"summary": "", "turns": deque(maxlen=MAX_TURNS), "touched": now, "size": 0}
+        _sessions[session_id] = entry
+        counters["sessions_created"] += 1
+    else:
+        _sessions.move_to_end(session_id)
+    entry["touched"] = now
+    return entry
+
+
+def load(session_id):
+    """(summary, recent messages) for a session, empty for session_id None."""
+    if session_id is None:
+        return "", []
+    now = time.time()
+    with _lock:
+        entry = _entry(session_id, now)
+        merged = summarizer.merge(session_id, entry["summary"])
+        if merged != entry["summary"]:
+            entry["summary"] = _cap_summary(merged)
+            _resize(entry)
+        _evict(now)
+        summary = entry["summary"]
+        recent = []
+        for user, assistant in entry["turns"]:
+            recent += [f"User: {user}", f"Assistant: {assistant}"]
+    return summary, recent
+
+
+def remember(session_id, query, answer, summarize):
+    """Add a turn, the turn pushed out of the ring is summarized in the background."""
+    if session_id is None:
+        return
+    now = time.time()
+    turn = (query[:MESSAGE_CHARS], answer[:MESSAGE_CHARS])
+    with _lock:
+        entry = _entry(session_id, now)
+        turns = entry["turns"]
+        dropped = None
+        if len(turns) == turns.maxlen:
+            dropped = turns[0] if turns else turn
+        turns.append(turn)
+        _resize(entry)
+        _evict(now)
+    if dropped is not None:
+        summarizer.request(session_id, [f"User: {dropped[0]}", f"Assistant: {dropped[1]}"], summarize)
+
+
+def forget(session_id):
+    with _lock:
+        if session_id in _sessions:
+            _drop(session_id)
+
+
+def stats():
+    with _lock:
+        return {**counters, "sessions": len(_sessions), "bytes": _bytes}
@@ -0,0 +1,131 @@
+import os
+os.environ["TOKENIZERS_PARALLELISM"] = "false"
+
+import threading
+import time
+from typing import Any, Dict, List
+
+import numpy as np
+from chromadb.api.types import Documents, EmbeddingFunction, Embeddings
+from semantic_router.encoders import DenseEncoder
+
+
+# setting both to the same model name makes the whole process load a single copy
+ROUTER_MODEL = os.environ.get("ROUTER_MODEL", "sentence-transformers/multi-qa-MiniLM-L6-cos-v1")
+RETRIEVAL_MODEL = os.environ.get("RETRIEVAL_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+# "torch" runs sentence-transformers, "onnx" the int8 ONNX Runtime export in onnx_encoder.py
+EMBEDDING_BACKEND = os.environ.get("EMBEDDING_BACKEND", "torch")
+
+_models = {}
+_lock = threading.Lock()
+
+load_stats = {}
+
+
+def _rss_mb():
+    try:
+        with open("/proc/self/statm") as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError):
+        return 0.0
+
+
+def _load(name, backend):
+    if backend == "onnx":
+        try:
+            import onnx_encoder
+            return onnx_encoder.OnnxModel(name)
+        except ImportError as e:
+            print(f"ONNX backend unavailable ({e}), using sentence-transformers for {name}")
+
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(name)
+
+
+def get_model(name, backend=None):
+    key = (backend or EMBEDDING_BACKEND, name)
+    model = _models.get(key)
+    if model is not None:
+        return model
+
+    with _lock:
+        if key not in _models:
+            rss_before = _rss_mb()
+            start = time.perf_counter()
+            _models[key] = _load(name, key[0])
+            load_stats[f"{key[0]}:{name}"] = {
+                "load_seconds": round(time.perf_counter() - start, 3),
+                "rss_mb": round(_rss_mb() - rss_before, 1),
+            }
+            stat = load_stats[f"{key[0]}:{name}"]
+            print(f"loaded {name} ({key[0]}) in {stat['load_seconds']}s (+{stat['rss_mb']} MB RSS)")
+    return _models[key]
+
+
+def encode(name, texts, backend=None):
+    return get_model(name, backend).encode(
+        list(texts),
+        convert_to_numpy=True,
+        normalize_embeddings=True,
+    ).astype(np.float32)
+
+
+def model_tag(name, backend=None):
+    """Identifies the vectors a model produces, stored with every Chroma collection."""
+    backend = backend or EMBEDDING_BACKEND
+    return name if backend == "torch" else f"{name}+{backend}-int8"
+
+
+def stats():
+    return {
+        "loaded": [f"{backend}:{name}" for backend, name in _models],
+        "models": dict(load_stats),
+        "rss_mb": round(_rss_mb(), 1),
+    }
+
+
+class SharedEmbeddingFunction(EmbeddingFunction[Documents]):
+    """Chroma embedding function backed by the process-wide model registry."""
+
+    def __init__(self, model_name: str = RETRIEVAL_MODEL):
+        self.model_name = model_name
+        self.model_tag = model_tag(model_name)
+
+    def __call__(self, input: Documents) -> Embeddings:
+        return [np.asarray(row, dtype=np.float32) for row in encode(self.model_name, input)]
+
+    @staticmethod
+    def name() -> str:
+        return "shared_sentence_transformer"
+
+    def default_space(self) -> str:
+        return "cosine"
+
+    def get_config(self) -> Dict[str, Any]:
+        return {"model_name": self.model_name}
+
+    @staticmethod
+    def build_from_config(config: Dict[str, Any]) -> "SharedEmbeddingFunction":
+        return SharedEmbeddingFunction(config["model_name"])
+
+
+class SharedEncoder(DenseEncoder):
+    """semantic-router encoder backed by the process-wide model registry.
+
+    Mean pooled and L2 normalised, which is what `HuggingFaceEncoder` produces
+    for the MiniLM sentence-transformers checkpoints.
+    """
+
+    type: str = "huggingface"
+    score_threshold: float = 0.5
+
+    def __call__(self, docs: List[Any]) -> List[List[float]]:
+        return encode(self.name, docs).tolist()
+
+    async def acall(self, docs: List[Any]) -> List[List[float]]:
+        return self(docs)
+
+
+def embedding_function(model_name=RETRIEVAL_MODEL):
+    return SharedEmbeddingFunction(model_name)
@@ -0,0 +1,195 @@
+"""In-process vector index for the small question/answer collections.
+
+The Chroma collection stays the store: embeddings are computed and persisted by
+vector_store.sync_csv, and copied from it into one contiguous float32 matrix here.
+A search is then a single matrix-vector product blended with a BM25 keyword score,
+so exact terms like "HDFC" or "COD" count even when the embedding misses them.
+
+    python np_index.py      # recall and latency against the Chroma path
+"""
+import json
+import os
+import re
+import threading
+import time
+from collections import Counter
+
+import numpy as np
+
+import models
+import vector_store
+
+
+# share of the score that comes from keywords, the rest is cosine similarity
+KEYWORD_WEIGHT = float(os.environ.get("HYBRID_KEYWORD_WEIGHT", 0.3))
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+STOPWORDS = {
+    "a", "an", "the", "is", "are", "was", "do", "does", "did", "i", "you", "we", "my", "your", "it",
+    "of", "to", "in", "on", "for", "with", "and", "or", "can", "could", "how", "what", "which", "when",
+    "where", "who", "why", "me", "be", "if", "any", "have", "has", "there", "this", "that", "will",
+}
+
+_indexes = {}
+_lock = threading.Lock()
+
+
+def tokenize(text):
+    return [word for word in re.findall(r"[a-z0-9]+", str(text).lower()) if word not in STOPWORDS]
+
+
+class NumpyIndex:
+    """Normalized embeddings plus a BM25 table over the question and answer of each row."""
+
+    def __init__(self, ids, documents, metadatas, embeddings, model_name=models.RETRIEVAL_MODEL):
+        self.ids = list(ids)
+        self.documents = list(documents)
+        self.metadatas = list(metadatas)
+        self.model_name = model_name
+
+        matrix = np.ascontiguousarray(np.asarray(embeddings, dtype=np.float32).reshape(len(self.ids), -1))
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        self.matrix = matrix / np.where(norms == 0, 1, norms)
+
+        texts = [
+            tokenize(f"{document} {(meta or {}).get('answer', '')}")
+            for document, meta in zip(self.documents, self.metadatas)
+        ]
+        self.vocabulary = {}
+        for words in texts:
+            for word in words:
+                self.vocabulary.setdefault(word, len(self.vocabulary))
+        lengths = np.array([len(words) for words in texts], dtype=np.float32)
+        average = float(lengths.mean()) if len(texts) else 0.0
+
+        # BM25 weight of every (word, row) pair, so a query only sums rows of this table
+        self.bm25 = np.zeros((len(self.vocabulary), len(texts)), dtype=np.float32)
+        frequency = np.zeros(len(self.vocabulary), dtype=np.float32)
+        for row, words in enumerate(texts):
+            for word, count in Counter(words).items():
+                term = self.vocabulary[word]
+                frequency[term] += 1
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths[row] / (average or 1))
+                self.bm25[term, row] = count * (BM25_K1 + 1) / (count + norm)
+        idf = np.log(1 + (len(texts) - frequency + 0.5) / (frequency + 0.5))
+        self.bm25 *= idf[:, None]
+
+    def __len__(self):
+        return len(self.ids)
+
+    def scores(self, vector, text):
+        """Blended score of every row for one query, cosine and BM25 both scaled to 0..1."""
+        dense = self.matrix @ vector
+        if KEYWORD_WEIGHT <= 0:
+            return dense
+        terms = [self.vocabulary[word] for word in set(tokenize(text)) if word in self.vocabulary]
+        if not terms:
+            return (1 - KEYWORD_WEIGHT) * dense
+        keyword = self.bm25[terms].sum(axis=0)
+        top = keyword.max()
+        if top > 0:
+            keyword = keyword / top
+        return (1 - KEYWORD_WEIGHT) * dense + KEYWORD_WEIGHT * keyword
+
+    def search(self, vectors, texts, n_results):
+        """Top rows per query in the shape of a Chroma query result.
+
+        distances are 1 - blended score, so smaller is closer as with Chroma.
+        """
+        result = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+        k = min(n_results, len(self))
+        for vector, text in zip(vectors, texts):
+            scores = self.scores(vector, text)
+            if k < len(self):
+                top = np.argpartition(-scores, k - 1)[:k]
+                top = top[np.argsort(-scores[top])]
+            else:
+                top = np.argsort(-scores)
+            result["ids"].append([self.ids[i] for i in top])
+            result["documents"].append([self.documents[i] for i in top])
+            result["metadatas"].append([self.metadatas[i] for i in top])
+            result["distances"].append([float(1 - scores[i]) for i in top])
+        return result
+
+    def query(self, query_texts, n_results=10):
+        if isinstance(query_texts, str):
+            query_texts = [query_texts]
+        vectors = models.encode(self.model_name, query_texts)
+        return self.search(vectors, query_texts, n_results)
+
+
+def build(name, collection=None, ef=None):
+    """(Re)build the index of collection `name` from the vectors Chroma already stores."""
+    ef = ef or models.embedding_function()
+    collection = collection or vector_store.get_collection(name, ef)
+    stored = collection.get(include=["embeddings", "documents", "metadatas"])
+    index = NumpyIndex(stored["ids"], stored["documents"], stored["metadatas"], stored["embeddings"],
+                       getattr(ef, "model_name", models.RETRIEVAL_MODEL))
+    with _lock:
+        _indexes[name] = index
+    return index
+
+
+def get(name, ef=None):
+    index = _indexes.get(name)
+    if index is None:
+        index = build(name, ef=ef)
+    return index
+
+
+def _latency_us(fn, queries, rounds=20):
+    fn(queries[0])
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for query in queries:
+            fn(query)
+    return round((time.perf_counter() - start) / (rounds * len(queries)) * 1e6, 1)
+
+
+def compare(k=2):
+    """Recall@k of the NumPy index against the Chroma results, and search latency.
+
+    The queries are the benchmark questions for each route plus the stored questions
+    themselves, for which the own row should come first.
+    """
+    import benchmark
+    import faq
+    import general_qa
+
+    corpus = benchmark.load_corpus()
+    report = {}
+    for route, name in (("faq", faq.collection_faq_name), ("general_qa", general_qa.collections_name)):
+        collection = vector_store.get_collection(name, faq.ef)
+        index = build(name, collection, faq.ef)
+        queries = [query for query, label in corpus if label == route] + index.documents
+        vectors = models.encode(index.model_name, queries)
+
+        chroma = collection.query(query_embeddings=[v.tolist() for v in vectors], n_results=k)
+        numpy_ = index.search(vectors, queries, k)
+        overlap = [len(set(a) & set(b)) / len(a) for a, b in zip(chroma["ids"], numpy_["ids"]) if a]
+        own = {
+            backend: float(np.mean([
+                ids[0] == vector_store.row_id(question)
+                for question, ids in zip(index.documents, result["ids"][-len(index.documents):])
+            ]))
+            for backend, result in (("chroma", chroma), ("numpy", numpy_))
+        }
+
+        report[name] = {
+            "rows": len(index),
+            "queries": len(queries),
+            f"recall_at_{k}_vs_chroma": round(float(np.mean(overlap)), 4),
+            "own_row_top1": {backend: round(value, 4) for backend, value in own.items()},
+            "search_us": {
+                "chroma": _latency_us(
+                    lambda q: collection.query(query_embeddings=[vectors[0].tolist()], n_results=k), queries[:10]),
+                "numpy": _latency_us(lambda q: index.search(vectors[:1], [q], k), queries[:10]),
+            },
+            "keyword_weight": KEYWORD_WEIGHT,
+        }
+    return report
+
+
+if __name__ == "__main__":
+    print(json.dumps(compare(), indent=2, ensure_ascii=False))
@@ -0,0 +1,197 @@
+import json
+import os
+import time
+from pathlib import Path
+
+import numpy as np
+
+
+onnx_path = Path(os.environ.get("ONNX_PATH", Path(__file__).parent / "onnx_models"))
+ONNX_THREADS = int(os.environ.get("ONNX_THREADS", 0))
+
+
+def model_dir(name):
+    return onnx_path / name.replace("/", "__")
+
+
+def export(name, directory=None):
+    """Export the transformer of sentence-transformers model `name` to ONNX and quantize it to int8.
+
+    Needs torch and onnxruntime, runs once per model, the files are reused afterwards.
+    """
+    import torch
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    from sentence_transformers import SentenceTransformer
+
+    directory = Path(directory or model_dir(name))
+    directory.mkdir(parents=True, exist_ok=True)
+    start = time.perf_counter()
+
+    st_model = SentenceTransformer(name, device="cpu")
+    transformer = st_model[0].auto_model.eval()
+    tokenizer = st_model.tokenizer
+
+    class _LastHiddenState(torch.nn.Module):
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+
+        def forward(self, input_ids, attention_mask, token_type_ids):
+            return self.model(
+                input_ids=input_ids,
+                attention_mask=attention_mask,
+                token_type_ids=token_type_ids,
+            )[0]
+
+    sample = tokenizer(["export sample"], return_tensors="pt")
+    dynamic = {0: "batch", 1: "sequence"}
+    fp32_file = directory / "model_fp32.onnx"
+    with torch.no_grad():
+        torch.onnx.export(
+            _LastHiddenState(transformer),
+            (sample["input_ids"], sample["attention_mask"], sample["token_type_ids"]),
+            str(fp32_file),
+            input_names=["input_ids", "attention_mask", "token_type_ids"],
+            output_names=["last_hidden_state"],
+            dynamic_axes={
+                "input_ids": dynamic,
+                "attention_mask": dynamic,
+                "token_type_ids": dynamic,
+                "last_hidden_state": dynamic,
+            },
+            opset_version=14,
+        )
+    quantize_dynamic(str(fp32_file), str(directory / "model_int8.onnx"), weight_type=QuantType.QInt8)
+    fp32_file.unlink()
+
+    tokenizer.save_pretrained(str(directory))
+    with open(directory / "encoder.json", "w") as f:
+        json.dump({"model": name, "max_seq_length": st_model.max_seq_length}, f)
+    print(f"exported {name} to {directory} in {time.perf_counter() - start:.1f}s")
+    return directory
+
+
+class OnnxModel:
+    """int8 ONNX Runtime stand-in for SentenceTransformer, mean pooled like the MiniLM checkpoints."""
+
+    def __init__(self, name):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        directory = model_dir(name)
+        if not (directory / "model_int8.onnx").exists():
+            export(name, directory)
+
+        with open(directory / "encoder.json") as f:
+            self.max_seq_length = json.load(f)["max_seq_length"]
+        self.tokenizer = AutoTokenizer.from_pretrained(str(directory))
+
+        options = ort.SessionOptions()
+        if ONNX_THREADS:
+            options.intra_op_num_threads = ONNX_THREADS
+        self.session = ort.InferenceSession(
+            str(directory / "model_int8.onnx"),
+            options,
+            providers=["CPUExecutionProvider"],
+        )
+        self.input_names = [i.name for i in self.session.get_inputs()]
+
+    def encode(self, sentences, batch_size=32, convert_to_numpy=True, normalize_embeddings=False):
+        sentences = list(sentences)
+        batches = []
+        for start in range(0, len(sentences), batch_size):
+            tokens = self.tokenizer(
+                sentences[start:start + batch_size],
+                padding=True,
+                truncation=True,
+                max_length=self.max_seq_length,
+                return_tensors="np",
+            )
+            feed = {name: tokens[name].astype(np.int64) for name in self.input_names}
+            hidden = self.session.run(None, feed)[0]
+            mask = tokens["attention_mask"][:, :, None].astype(np.float32)
+            batches.append((hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None))
+
+        embeddings = np.concatenate(batches) if batches else np.zeros((0, 0), dtype=np.float32)
+        if normalize_embeddings and len(embeddings):
+            embeddings = embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+        return embeddings.astype(np.float32)
+
+
+def _texts():
+    import pandas as pd
+
+    import router
+
+    utterances = [u for route in (router.faq, router.sql, router.general_qa) for u in route.utterances]
+    questions = []
+    for csv in ("faq_data.csv", "ecommerce_chatbot_qna.csv"):
+        questions += pd.read_csv(Path(__file__).parent / "resources" / csv)["question"].astype(str).tolist()
+    return utterances, questions
+
+
+def _latency_ms(model_name, backend, texts):
+    import models
+
+    timings = []
+    for text in texts:
+        start = time.perf_counter()
+        models.encode(model_name, [text], backend)
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return round(timings[len(timings) // 2], 2), round(timings[int(len(timings) * 0.95)], 2)
+
+
+def compare():
+    """int8 ONNX against the fp32 sentence-transformers model on the project's own texts.
+
+    Cosine between the two embeddings of each text, routing decisions for the CSV
+    questions, top-1 retrieval neighbours, single-query latency and load memory.
+    """
+    import models
+    import router
+
+    utterances, questions = _texts()
+    report = {}
+
+    for model_name in sorted({models.ROUTER_MODEL, models.RETRIEVAL_MODEL}):
+        texts = utterances + questions
+        fp32 = models.encode(model_name, texts, "torch")
+        int8 = models.encode(model_name, texts, "onnx")
+        cosine = np.sum(fp32 * int8, axis=1)
+
+        # retrieval: nearest CSV question for every utterance
+        fp32_top = np.argmax(fp32[:len(utterances)] @ fp32[len(utterances):].T, axis=1)
+        int8_top = np.argmax(int8[:len(utterances)] @ int8[len(utterances):].T, axis=1)
+
+        report[model_name] = {
+            "cosine_mean": round(float(cosine.mean()), 4),
+            "cosine_min": round(float(cosine.min()), 4),
+            "retrieval_top1_agreement": round(float(np.mean(fp32_top == int8_top)), 4),
+            "latency_ms_p50_p95": {
+                backend: _latency_ms(model_name, backend, questions[:100]) for backend in ("torch", "onnx")
+            },
+            "load": {
+                backend: models.load_stats.get(f"{backend}:{model_name}") for backend in ("torch", "onnx")
+            },
+        }
+
+    fp32_routes = router.score_batch(
+        models.encode(models.ROUTER_MODEL, questions, "torch"), router._utterance_matrix("torch")
+    )
+    int8_routes = router.score_batch(
+        models.encode(models.ROUTER_MODEL, questions, "onnx"), router._utterance_matrix("onnx")
+    )
+    changed = [
+        (question, a[0], b[0]) for question, a, b in zip(questions, fp32_routes, int8_routes) if a[0] != b[0]
+    ]
+    report["routing"] = {
+        "questions": len(questions),
+        "agreement": round(1 - len(changed) / len(questions), 4),
+        "changed": changed,
+    }
+    return report
+
+
+if __name__ == "__main__":
+    print(json.dumps(compare(), indent=2, ensure_ascii=False))
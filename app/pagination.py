@@ -0,0 +1,146 @@
+import os
+import re
+
+import db_pool
+
+
+PAGE_SIZE = int(os.environ.get("SQL_PAGE_SIZE", 4))
+
+COLUMNS = {
+    "product_link", "title", "brand", "price", "avg_rating", "total_ratings",
+    # product_ranked, see catalog.RANKINGS
+    "score", "score_rank", "popularity_rank", "price_bucket", "bucket_rank", "brand_rank",
+}
+
+MORE_PATTERN = re.compile(
+    r"^(?:ok(?:ay)?\s+)?(?:please\s+)?(?:show|give|load|see|list)?\s*(?:me\s+)?(?:some\s+)?(?:the\s+)?"
+    r"(?:more|next)(?:\s+(?:results?|products?|items?|options?|ones?|page))?(?:\s+please)?[\s.!?]*$"
+)
+
+_ORDER_BY = re.compile(r"\border\s+by\b", re.IGNORECASE)
+_LIMIT = re.compile(r"\blimit\b", re.IGNORECASE)
+_ORDER_TERM = re.compile(r"^([a-z_]+)(?:\s+(asc|desc))?$", re.IGNORECASE)
+_LIMIT_COUNT = re.compile(r"^\s*(\d+)\s*$")
+_SELECT_ALL = re.compile(r"^select\s+(?:[a-z_]+\.)?\*\s+from\b", re.IGNORECASE)
+
+
+def is_more_request(query):
+    return MORE_PATTERN.match(query.lower().strip()) is not None
+
+
+def _top_level_tail(statement, pattern):
+    """Start of the last `pattern` match that is not inside parentheses, or None."""
+    for match in reversed(list(pattern.finditer(statement))):
+        tail = statement[match.end():]
+        if tail.count("(") == tail.count(")"):
+            return match
+    return None
+
+
+def split_statement(statement):
+    """Return (base statement, sort keys, row cap) with the top-level ORDER BY and LIMIT removed.
+
+    Sort keys are (column, descending) pairs ending with product_link, so every row
+    has a unique position. The cap is the LIMIT the statement asked for, or None.
+    None if the rows are not whole products, the ordering is not on plain columns
+    or the LIMIT is not a plain row count.
+    """
+    statement = statement.strip().rstrip(";").strip()
+    if not _SELECT_ALL.match(statement):
+        return None
+
+    cap = None
+    limit = _top_level_tail(statement, _LIMIT)
+    if limit is not None:
+        count = _LIMIT_COUNT.match(statement[limit.end():])
+        if count is None:
+            # an OFFSET or an expression, the offset fallback keeps the statement as written
+            return None
+        cap = int(count.group(1))
+        statement = statement[:limit.start()].rstrip()
+
+    keys = []
+    order = _top_level_tail(statement, _ORDER_BY)
+    if order is not None:
+        for term in statement[order.end():].split(","):
+            match = _ORDER_TERM.match(term.strip())
+            if match is None or match.group(1).lower() not in COLUMNS:
+                return None
+            keys.append((match.group(1).lower(), (match.group(2) or "").lower() == "desc"))
+        statement = statement[:order.start()].rstrip()
+
+    if "product_link" not in [column for column, _ in keys]:
+        keys.append(("product_link", False))
+    return statement, keys, cap
+
+
+def _order_clause(keys):
+    return ", ".join(f"{column} {'DESC' if descending else 'ASC'}" for column, descending in keys)
+
+
+def _page_sql(base, keys, last):
+    sql = f"SELECT * FROM ({base}) AS page"
+    params = []
+    if last is not None:
+        # (a, b, link) strictly after the last row in the (a, b, link) ordering
+        branches = []
+        for i, (column, descending) in enumerate(keys):
+            terms = [f"{c} = ?" for c, _ in keys[:i]] + [f"{column} {'<' if descending else '>'} ?"]
+            branches.append("(" + " AND ".join(terms) + ")")
+            params.extend(last[:i + 1])
+        sql += " WHERE " + " OR ".join(branches)
+    sql += " ORDER BY " + _order_clause(keys)
+    return sql, params
+
+
+def _fetch(cursor, page_size):
+    if cursor["cap"] is not None:
+        page_size = min(page_size, cursor["cap"] - cursor["shown"])
+        if page_size <= 0:
+            return [], cursor
+    if cursor["keys"] is not None:
+        sql, keyset_params = _page_sql(cursor["base"], cursor["keys"], cursor["last"])
+        rows = db_pool.execute(sql, tuple(cursor["params"]) + tuple(keyset_params), limit=page_size)
+    else:
+        # aggregates or ordering on expressions, fall back to an offset over the original statement
+        sql = f"SELECT * FROM ({cursor['statement']}) AS page LIMIT {int(page_size)} OFFSET {int(cursor['shown'])}"
+        rows = db_pool.execute(sql, tuple(cursor["params"]), limit=None)
+
+    if rows:
+        cursor = dict(cursor, shown=cursor["shown"] + len(rows))
+        if cursor["keys"] is not None:
+            last = [rows[-1].get(column) for column, _ in cursor["keys"]]
+            if any(value is None for value in last):
+                # NULLs have no place in a keyset comparison, keep the same order by offset
+                cursor["statement"] = f"{cursor['base']} ORDER BY {_order_clause(cursor['keys'])}"
+                cursor["keys"] = None
+            else:
+                cursor["last"] = last
+    return rows, cursor
+
+
+def first_page(statement, params=(), page_size=PAGE_SIZE):
+    """Run the first page of `statement`, returns (rows, cursor for next_page)."""
+    split = split_statement(statement)
+    if split is None:
+        cursor = {"statement": statement.strip().rstrip(";"), "base": None, "keys": None,
+                  "params": tuple(params), "last": None, "shown": 0, "cap": None}
+    else:
+        base, keys, cap = split
+        cursor = {"statement": None, "base": base, "keys": keys,
+                  "params": tuple(params), "last": None, "shown": 0, "cap": cap}
+    return _fetch(cursor, page_size)
+
+
+def next_page(cursor, page_size=PAGE_SIZE):
+    return _fetch(cursor, page_size)
+
+
+def render(rows, start=1):
+    lines = []
+    for i, row in enumerate(rows, start=start):
+        lines.append(
+            f"{i}. {row.get('title')}: Rs. {row.get('price')}, "
+            f"Rating: {row.get('avg_rating')} ({row.get('total_ratings')} ratings) {row.get('product_link')}"
+        )
+    return "\n".join(lines)
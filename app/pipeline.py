@@ -0,0 +1,134 @@
+import asyncio
+import os
+
+import aio
+import fallback_qa
+import general_qa
+import memory
+import router
+import sql
+import streaming
+import telemetry
+
+
+# the first embed call also loads the model, so its budget is generous
+EMBED_TIMEOUT = float(os.environ.get("PIPELINE_EMBED_TIMEOUT", 30))
+RETRIEVAL_TIMEOUT = float(os.environ.get("PIPELINE_RETRIEVAL_TIMEOUT", 5))
+CHAIN_TIMEOUT = float(os.environ.get("PIPELINE_CHAIN_TIMEOUT", 60))
+
+# vector lookups started before the route is known, keyed by the route that uses them.
+# the faq route is answered by fallback_qa, which needs no lookup.
+SPECULATIVE = {
+    "general_qa": general_qa.query_relevant_answ,
+}
+
+# the LLM call that folds turns leaving a session's memory into its summary
+SUMMARIZE = {
+    "sql": sql.asummary_generation,
+    "general_qa": general_qa.asummary_generation,
+}
+
+
+def _consume(task):
+    # a speculative lookup nobody waited for must not log "exception was never retrieved"
+    if not task.cancelled():
+        task.exception()
+
+
+async def _lookup(route, lookup, query):
+    with telemetry.span("retrieval", route=route, speculative=True):
+        return await asyncio.wait_for(asyncio.to_thread(lookup, query), RETRIEVAL_TIMEOUT)
+
+
+async def embed_and_retrieve(query, speculate=True):
+    """Embed the query for routing while the lookups a route may need already run.
+
+    Returns the query vector and a dict of route name -> lookup task.
+    """
+    retrievals = {}
+    if speculate:
+        for route, lookup in SPECULATIVE.items():
+            task = asyncio.create_task(_lookup(route, lookup, query))
+            task.add_done_callback(_consume)
+            retrievals[route] = task
+
+    try:
+        with telemetry.span("embed"):
+            vector = await asyncio.wait_for(asyncio.to_thread(router.embed, query), EMBED_TIMEOUT)
+    except BaseException:
+        for task in retrievals.values():
+            task.cancel()
+        raise
+    return vector, retrievals
+
+
+async def _prefetched(retrievals, route):
+    task = retrievals.pop(route, None)
+    if task is None:
+        return None
+    try:
+        return await task
+    except Exception:
+        # timed out or failed, the chain runs the lookup itself
+        return None
+
+
+async def _bounded(chunks, timeout):
+    """Pass `chunks` through, failing once the whole stream runs past `timeout`."""
+    deadline = asyncio.get_running_loop().time() + timeout
+    try:
+        while True:
+            remaining = deadline - asyncio.get_running_loop().time()
+            try:
+                yield await asyncio.wait_for(chunks.__anext__(), max(remaining, 0))
+            except StopAsyncIteration:
+                return
+    finally:
+        await chunks.aclose()
+
+
+async def respond_stream(query, route, retrievals=None, session=None, listing=None, result=None):
+    """Stream the answer to `query` from the chain for `route`.
+
+    The chain sees the memory of `session`, the finished turn is added to it once the
+    stream is exhausted and `result["answer"]` is set. session None answers without history.
+    """
+    retrievals = retrievals if retrievals is not None else {}
+    result = result if result is not None else {}
+    summary, recent_msgs = memory.load(session)
+    try:
+        if route == "sql":
+            chunks = sql.asql_chain_stream(query, listing, summary, recent_msgs)
+
+        elif route == "general_qa":
+            prefetched = await _prefetched(retrievals, "general_qa")
+            chunks = general_qa.ageneral_qa_chain_stream(query, prefetched, summary, recent_msgs)
+
+        else:
+            chunks = fallback_qa.afallback_chain_stream(query, summary, recent_msgs)
+
+        tokens = []
+        with telemetry.span("answer", route=route) as answer_span:
+            async for token in _bounded(chunks, CHAIN_TIMEOUT):
+                tokens.append(token)
+                yield token
+            answer_span.tag(chars=sum(len(token) for token in tokens))
+        result["answer"] = "".join(tokens).strip()
+        memory.remember(session, query, result["answer"], SUMMARIZE.get(route, fallback_qa.asummarize_conversation))
+    finally:
+        for task in retrievals.values():
+            task.cancel()
+
+
+async def respond(query, route, retrievals=None, session=None, listing=None):
+    """Answer `query` with the chain for `route`, see respond_stream."""
+    result = {}
+    await streaming.collect(respond_stream(query, route, retrievals, session, listing, result))
+    return result["answer"]
+
+
+def cancel(retrievals):
+    """Cancel lookups that are no longer needed, callable from any thread."""
+    loop = aio.get_loop()
+    for task in retrievals.values():
+        loop.call_soon_threadsafe(task.cancel)
@@ -0,0 +1,120 @@
+import math
+import os
+import re
+import threading
+
+import numpy as np
+
+import models
+import telemetry
+
+
+# prompt tokens allowed per call, what is left of the context window goes to the answer
+DEFAULT_BUDGET = int(os.environ.get("PROMPT_TOKEN_BUDGET", 2000))
+MODEL_BUDGETS = {
+    "llama-3.3-70b-versatile": int(os.environ.get("PROMPT_TOKEN_BUDGET_70B", 3000)),
+}
+# history turns sent with a prompt, picked by similarity to the question
+HISTORY_TURNS = int(os.environ.get("PROMPT_HISTORY_TURNS", 2))
+
+_PIECE = re.compile(r"\w+|[^\w\s]")
+
+_lock = threading.Lock()
+usage = {}
+
+
+def count_tokens(text):
+    """Approximate token count, long words split into pieces of about four characters."""
+    return sum(math.ceil(len(piece) / 4) for piece in _PIECE.findall(text or ""))
+
+
+def budget_for(model):
+    return MODEL_BUDGETS.get(model, DEFAULT_BUDGET)
+
+
+def _turns(recent_msgs):
+    recent_msgs = list(recent_msgs)
+    return ["\n".join(recent_msgs[i:i + 2]) for i in range(0, len(recent_msgs), 2)]
+
+
+def select_history(query, recent_msgs, limit=HISTORY_TURNS):
+    """The `limit` turns closest to `query`, in conversation order.
+
+    The latest turn is always kept, follow-ups like "and the cheaper one?" refer to it.
+    """
+    turns = _turns(recent_msgs)
+    if limit <= 0:
+        return []
+    if len(turns) <= limit:
+        return turns
+
+    vectors = models.encode(models.RETRIEVAL_MODEL, [query] + turns[:-1])
+    scores = vectors[1:] @ vectors[0]
+    keep = [len(turns) - 1] + [int(i) for i in np.argsort(-scores)[:limit - 1]]
+    return [turns[i] for i in sorted(keep)]
+
+
+def _fit_tail(text, tokens):
+    """The end of `text` within `tokens`, cut at a line break where possible."""
+    if tokens <= 0:
+        return ""
+    if count_tokens(text) <= tokens:
+        return text
+    lines = text.splitlines()
+    while lines and count_tokens("\n".join(lines)) > tokens:
+        lines.pop(0)
+    return "\n".join(lines)
+
+
+def build(instructions, user, model, query, summary="", recent_msgs=()):
+    """Chat messages within the token budget of `model`, plus their estimated token count.
+
+    `instructions` must not change between calls: it is sent alone as the system
+    message, so the provider can serve it from its prompt cache. The summary and the
+    selected history go in front of `user`. The most relevant history is kept over the
+    summary, and the oldest parts of both are dropped first when over budget.
+    """
+    fixed = count_tokens(instructions) + count_tokens(user)
+    room = budget_for(model) - fixed
+
+    history = select_history(query, recent_msgs)
+    while history and count_tokens("\n".join(history)) > room:
+        history.pop(0)
+    history_text = "\n".join(history)
+    summary = _fit_tail(summary.strip(), room - count_tokens(history_text))
+
+    parts = []
+    if summary:
+        parts.append(f"Summary of previous conversation:\n{summary}")
+    if history_text:
+        parts.append(f"Chat history:\n{history_text}")
+    parts.append(user)
+    content = "\n\n".join(parts)
+
+    messages = [
+        {"role": "system", "content": instructions},
+        {"role": "user", "content": content},
+    ]
+    return messages, count_tokens(instructions) + count_tokens(content)
+
+
+def record(label, estimated, reported=None):
+    """Count the prompt size of one call, `reported` is the usage object of the response."""
+    prompt_tokens = getattr(reported, "prompt_tokens", None)
+    details = getattr(reported, "prompt_tokens_details", None)
+    cached = getattr(details, "cached_tokens", None) or 0
+    with _lock:
+        entry = usage.setdefault(label, {"calls": 0, "estimated": 0, "prompt_tokens": 0, "cached_tokens": 0})
+        entry["calls"] += 1
+        entry["estimated"] += estimated
+        entry["prompt_tokens"] += prompt_tokens or 0
+        entry["cached_tokens"] += cached
+    telemetry.count("llm_prompt_tokens_estimated_total", estimated, call=label)
+    if prompt_tokens is not None:
+        telemetry.count("llm_prompt_tokens_total", prompt_tokens, call=label)
+        telemetry.count("llm_cached_tokens_total", cached, call=label)
+
+
+def stats():
+    with _lock:
+        return {label: dict(entry) for label, entry in usage.items()}
@@ -1,13 +1,18 @@
 import os
 os.environ["TOKENIZERS_PARALLELISM"] = "false"
 
+import threading
+import time
+
+import numpy as np
 from semantic_router import Route
-from semantic_router.encoders import HuggingFaceEncoder
 from semantic_router.routers import SemanticRouter
 
-encoder = HuggingFaceEncoder(
-    name="sentence-transformers/multi-qa-MiniLM-L6-cos-v1"
-)
+import models
+from models import ROUTER_MODEL, SharedEncoder
+
+# the model itself is loaded on the first encode call, see models.get_model
+encoder = SharedEncoder(name=ROUTER_MODEL)
 
 faq = Route(
     name='faq',
@@ -152,14 +157,146 @@ general_qa = Route(
 
 
 
-router = SemanticRouter(
-    routes=[faq, sql, general_qa],
-    encoder=encoder,
-    auto_sync="local",
-)
+BATCH_SIZE = int(os.environ.get("ROUTER_BATCH_SIZE", 64))
+
+_router = None
+_router_lock = threading.Lock()
+_matrix = None
+
+
+def get_router():
+    global _router
+    if _router is None:
+        with _router_lock:
+            if _router is None:
+                _router = SemanticRouter(
+                    routes=[faq, sql, general_qa],
+                    encoder=encoder,
+                    auto_sync="local",
+                )
+    return _router
+
+
+def __getattr__(name):
+    # keeps `router.router(query)` working while building the index on first use
+    if name == "router":
+        return get_router()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def embed(query):
+    return encoder([query])[0]
+
+
+def _utterance_matrix(backend=None):
+    """The router's utterance vectors, unit length, with a route id per row.
+
+    With a `backend` the utterances are re-encoded with that embedding backend
+    instead of reusing the vectors in the router index.
+    """
+    global _matrix
+    if backend is None and _matrix is not None:
+        return _matrix
+
+    index = get_router().index
+    names = sorted(set(index.routes.tolist()))
+    if backend is None:
+        vectors = np.asarray(index.index, dtype=np.float32)
+    else:
+        vectors = models.encode(ROUTER_MODEL, index.utterances.tolist(), backend)
+    vectors = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    route_ids = np.array([names.index(name) for name in index.routes.tolist()])
+    thresholds = []
+    for name in names:
+        route = next(r for r in get_router().routes if r.name == name)
+        threshold = route.score_threshold if route.score_threshold is not None else get_router().score_threshold
+        # like SemanticRouter, a missing or zero threshold lets every score pass
+        thresholds.append(threshold if threshold else -np.inf)
+    matrix = (vectors, route_ids, names, np.array(thresholds, dtype=np.float32))
+    if backend is None:
+        _matrix = matrix
+    return matrix
+
+
+def score_batch(vectors, matrix=None):
+    """Route pre-computed query vectors, the same decision SemanticRouter makes per query.
+
+    Top-k utterances per query, scores averaged per route, and the best route whose
+    average clears its threshold. Returns a list of (route name or None, score or None).
+    """
+    matrix, route_ids, names, thresholds = matrix or _utterance_matrix()
+    queries = np.asarray(vectors, dtype=np.float32)
+    queries = queries / np.linalg.norm(queries, axis=1, keepdims=True)
+    sim = queries @ matrix.T
+
+    top_k = min(get_router().top_k, sim.shape[1])
+    top = np.argpartition(sim, -top_k, axis=1)[:, -top_k:]
+    top_scores = np.take_along_axis(sim, top, axis=1)
+    onehot = route_ids[top][:, :, None] == np.arange(len(names))[None, None, :]
+    counts = onehot.sum(axis=1)
+    means = (top_scores[:, :, None] * onehot).sum(axis=1) / np.maximum(counts, 1)
+
+    passed = (counts > 0) & (means >= thresholds[None, :])
+    best = np.where(passed, means, -np.inf).argmax(axis=1)
+    results = []
+    for row, route in enumerate(best):
+        if passed[row, route]:
+            results.append((names[route], float(means[row, route])))
+        else:
+            results.append((None, None))
+    return results
+
+
+def route_batch(queries, batch_size=BATCH_SIZE):
+    """Route many queries, encoded `batch_size` at a time. See score_batch."""
+    results = []
+    for start in range(0, len(queries), batch_size):
+        vectors = models.encode(ROUTER_MODEL, queries[start:start + batch_size])
+        results.extend(score_batch(vectors))
+    return results
+
+
+def compare_batch(queries, batch_size=BATCH_SIZE):
+    """Throughput of route_batch against one router call per query, and where they disagree."""
+    queries = list(queries)
+    get_router()
+    _utterance_matrix()
+    models.get_model(ROUTER_MODEL)
+
+    start = time.perf_counter()
+    batched = route_batch(queries, batch_size)
+    batch_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    single = [get_router()(text=query).name for query in queries]
+    single_seconds = time.perf_counter() - start
+
+    mismatches = [
+        (query, name, expected)
+        for query, (name, _), expected in zip(queries, batched, single)
+        if name != expected
+    ]
+    return {
+        "queries": len(queries),
+        "batch_qps": round(len(queries) / batch_seconds, 1),
+        "single_qps": round(len(queries) / single_seconds, 1),
+        "agreement": 1 - len(mismatches) / len(queries) if queries else 1.0,
+        "mismatches": mismatches,
+    }
 
 
 if __name__ == "__main__":
+    router = get_router()
     print(router("What is your policy on defective product").name)
     print(router("shoes in price range 5000 to 1000").name)
     print(router("what is your role").name)
+
+    import sys
+    from pathlib import Path
+    path = Path(sys.argv[1]) if len(sys.argv) > 1 else Path(__file__).parent / "resources/common_queries.txt"
+    queries = [line.strip() for line in path.read_text().splitlines() if line.strip() and not line.startswith("#")]
+    report = compare_batch(queries * max(1, 1000 // max(len(queries), 1)))
+    print(f"{report['queries']} queries: batch {report['batch_qps']} q/s, "
+          f"single {report['single_qps']} q/s, agreement {report['agreement']:.2%}")
+    for query, got, expected in report["mismatches"][:20]:
+        print(f"  {query!r}: batch={got} router={expected}")
@@ -0,0 +1,173 @@
+"""HTTP API for the chat engine, for clients other than the Streamlit UI.
+
+    POST   /chat              {"message": "...", "session_id": "...", "stream": true}
+    DELETE /sessions/<id>     drop the conversation memory of a session
+    GET    /healthz
+    GET    /metrics           Prometheus text, when TELEMETRY is on
+
+Streamed replies are chunked text/plain, the session id comes back in X-Session-Id.
+"""
+import json
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import engine
+import telemetry
+
+
+HOST = os.environ.get("CHAT_HOST", "0.0.0.0")
+PORT = int(os.environ.get("CHAT_PORT", 8000))
+# requests answered at once, and how many more may wait for a worker before getting a 503
+WORKERS = int(os.environ.get("CHAT_WORKERS", 8))
+BACKLOG = int(os.environ.get("CHAT_BACKLOG", 32))
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _chunk(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            return None
+        return body if isinstance(body, dict) else None
+
+    def do_GET(self):
+        path = self.path.split("?")[0]
+        if path == "/healthz":
+            self._send_json(200, {"status": "ok"})
+        elif path == "/metrics":
+            data = telemetry.render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(data)))
+            self.send_header("Connection", "close")
+            self.end_headers()
+            self.wfile.write(data)
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def do_DELETE(self):
+        prefix = "/sessions/"
+        if not self.path.startswith(prefix) or len(self.path) == len(prefix):
+            self._send_json(404, {"error": "not found"})
+            return
+        engine.forget(self.path[len(prefix):])
+        self._send_json(200, {"status": "forgotten"})
+
+    def do_POST(self):
+        if self.path.split("?")[0] != "/chat":
+            self._send_json(404, {"error": "not found"})
+            return
+
+        body = self._read_json()
+        message = (body or {}).get("message")
+        if not isinstance(message, str) or not message.strip():
+            self._send_json(400, {"error": "expected a JSON body with a non-empty \"message\""})
+            return
+        session_id = str(body.get("session_id") or uuid.uuid4().hex)
+
+        if not body.get("stream", True):
+            answer = engine.answer(session_id, message)
+            self._send_json(200, {"session_id": session_id, "answer": answer})
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; charset=utf-8")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.send_header("X-Session-Id", session_id)
+        self.send_header("Connection", "close")
+        self.end_headers()
+        chunks = engine.stream(session_id, message)
+        try:
+            for text in chunks:
+                if text:
+                    self._chunk(text.encode())
+            self._chunk(b"")
+        except (BrokenPipeError, ConnectionResetError):
+            print(f"client of session {session_id} went away mid-reply")
+        finally:
+            chunks.close()
+
+
+_body = b'{"error": "overloaded"}'
+OVERLOADED = (
+    b"HTTP/1.1 503 Service Unavailable\r\nRetry-After: 1\r\nContent-Type: application/json\r\n"
+    + f"Content-Length: {len(_body)}\r\nConnection: close\r\n\r\n".encode()
+    + _body
+)
+
+
+class PooledHTTPServer(HTTPServer):
+    """Hands every connection to a fixed pool of workers, refusing them when it is full.
+
+    The engine keeps one copy of the models, the vector store and the database
+    connections per process, so all workers share them.
+    """
+
+    def __init__(self, address, handler, workers=WORKERS, backlog=BACKLOG):
+        super().__init__(address, handler)
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="chat")
+        self.slots = threading.BoundedSemaphore(workers + backlog)
+
+    def process_request(self, request, client_address):
+        if not self.slots.acquire(blocking=False):
+            telemetry.count("chat_requests_rejected_total")
+            try:
+                request.sendall(OVERLOADED)
+            except OSError:
+                pass
+            self.shutdown_request(request)
+            return
+        self.pool.submit(self._work, request, client_address)
+
+    def _work(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            self.slots.release()
+
+    def server_close(self):
+        super().server_close()
+        self.pool.shutdown(wait=False)
+
+
+def start(host=HOST, port=PORT, workers=WORKERS, backlog=BACKLOG):
+    """Prepare the engine and serve from a daemon thread, returns the server."""
+    engine.prepare()
+    server = PooledHTTPServer((host, port), Handler, workers=workers, backlog=backlog)
+    threading.Thread(target=server.serve_forever, name="chat-server", daemon=True).start()
+    print(f"chat API on http://{host}:{server.server_address[1]} with {workers} workers")
+    return server
+
+
+if __name__ == "__main__":
+    server = start()
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,114 @@
+import threading
+
+import telemetry
+
+
+_flights = {}
+_lock = threading.Lock()
+
+counters = {"leaders": 0, "coalesced": 0, "failed": 0}
+
+
+class Flight:
+    """The chunks of one answer as they are produced, readable from other threads."""
+
+    def __init__(self):
+        self.chunks = []
+        self.done = False
+        self.error = None
+        self.followers = 0
+        self.cond = threading.Condition()
+
+    def add(self, chunk):
+        with self.cond:
+            self.chunks.append(chunk)
+            self.cond.notify_all()
+
+    def finish(self, error=None):
+        with self.cond:
+            self.error = error
+            self.done = True
+            self.cond.notify_all()
+
+
+def _lead(key, flight, chunks):
+    error = None
+    try:
+        for chunk in chunks:
+            flight.add(chunk)
+            yield chunk
+    except GeneratorExit:
+        # the leader's client went away, the followers still get the rest
+        if flight.followers:
+            try:
+                for chunk in chunks:
+                    flight.add(chunk)
+            except Exception as e:
+                error = e
+        else:
+            error = ConnectionAbortedError("the request was abandoned")
+        raise
+    except Exception as e:
+        error = e
+        raise
+    finally:
+        with _lock:
+            if _flights.get(key) is flight:
+                del _flights[key]
+            if error is not None:
+                counters["failed"] += 1
+        flight.finish(error)
+
+
+def _follow(flight):
+    sent = 0
+    while True:
+        with flight.cond:
+            while sent == len(flight.chunks) and not flight.done:
+                flight.cond.wait()
+            pending = flight.chunks[sent:]
+            done, error = flight.done, flight.error
+        for chunk in pending:
+            yield chunk
+        sent += len(pending)
+        if done and sent == len(flight.chunks):
+            if error is not None:
+                raise error
+            return
+
+
+def stream(key, produce, route=None):
+    """The chunks of `produce()`, shared by every caller asking for `key` while it runs.
+
+    The first caller runs `produce` and the ones arriving before it finishes replay its
+    chunks as they come, so identical requests make one upstream call. Errors reach
+    every caller.
+    """
+    with _lock:
+        flight = _flights.get(key)
+        if flight is None:
+            flight = _flights[key] = Flight()
+            counters["leaders"] += 1
+            leader = True
+        else:
+            flight.followers += 1
+            counters["coalesced"] += 1
+            leader = False
+
+    if leader:
+        try:
+            chunks = produce()
+        except BaseException as e:
+            with _lock:
+                del _flights[key]
+            flight.finish(e)
+            raise
+        yield from _lead(key, flight, chunks)
+    else:
+        telemetry.count("singleflight_coalesced_total", route=route)
+        yield from _follow(flight)
+
+
+def stats():
+    with _lock:
+        return {**counters, "in_flight": len(_flights)}
@@ -1,29 +1,34 @@
-import sqlite3
-import pandas as pd
 from dotenv import load_dotenv
-from groq import Groq
 from pathlib import Path
-import os
+import asyncio
 import re
 
+import aio
+import db_pool
+import fast_sql
+import llm_gateway
+import pagination
+import prompt_builder
+import sql_templates
+import streaming
+import telemetry
+
 
 load_dotenv()
-groq_client = Groq()
 sqldb_path = Path(__file__).parent/"db.sqlite"
 
-convo_summary = ""
-recent_chats = []
+Max_Results = pagination.PAGE_SIZE
 
-Max_Chat_Size = 4
-Summary_trigger = 8
+def run_query(question, params=(), limit=db_pool.MAX_ROWS):
+    if question.strip().upper().startswith('SELECT'):
+        return db_pool.execute(question, params, limit=limit)
 
-def run_query(question):
+def run_first_page(question, params=()):
     if question.strip().upper().startswith('SELECT'):
-        with sqlite3.Connection(sqldb_path) as conn:
-            df = pd.read_sql_query(question,conn)
-            return df
+        return pagination.first_page(question, params, page_size=Max_Results)
+    return None, None
 
-def generate_query(question):
+async def agenerate_query(question):
     prompt = f'''
         You are an expert in understanding the database schema and generating SQL queries for a natural language question asked
         pertaining to the data you have. The schema is provided in the schema tags. 
@@ -37,15 +42,42 @@ def generate_query(question):
         discount - float (discount on the product. 10 percent discount is represented as 0.1, 20 percent as 0.2, and such.)	
         avg_rating - float (average rating of the product. Range 0-5, 5 is the highest.)	
         total_ratings - integer (total number of ratings for the product)
+        indexes: price, LOWER(brand), avg_rating, total_ratings
+
+        virtual table: product_fts (SQLite FTS5 full-text index)
+        fields:
+        title - words of product.title, stemmed, so "laptops" also matches "laptop"
+        brand - words of product.brand
+        product_fts.rowid is the rowid of the matching product row
+
+        view: product_ranked (every product field above, plus precomputed rankings)
+        fields:
+        product_rowid - integer (rowid of the product row)
+        score - float (avg_rating weighted by total_ratings, a 5.0 from 2 ratings scores below 4.6 from 40000)
+        score_rank - integer (1 is the best score in the catalog)
+        popularity_rank - integer (1 has the most ratings in the catalog)
+        price_bucket - integer (price band of the catalog, 1 budget to 5 premium)
+        bucket_rank - integer (1 is the best score within its price_bucket)
+        brand_rank - integer (1 is the best score within its brand)
+        indexes: score_rank, popularity_rank, (price_bucket, bucket_rank)
         </schema>
-        Make sure whenever you try to search for the brand name, the name can be in any case add like  LOWER(brand). 
-        So, make sure to use %LIKE% to find the brand in condition. Never use "ILIKE". 
+        To search by brand or by words of the product name, never use LIKE. Filter with the full-text index:
+        rowid IN (SELECT rowid FROM product_fts WHERE product_fts MATCH '<expression>')
+        In the expression write brand words as brand:word and product words as title:word, joined with AND,
+        for example MATCH 'brand:nike AND title:shoes'. Use only lowercase letters and digits in the words.
+        If the exact brand name is given you may also use LOWER(brand) = 'name'. Never use "ILIKE". 
+        Filter price, avg_rating and total_ratings with plain comparisons (price < 5000, avg_rating >= 4)
+        and sort with ORDER BY on those columns directly, so the indexes are used.
+        For top rated, best or highly rated products select from product_ranked and ORDER BY score_rank,
+        for popular, most reviewed or best selling ORDER BY popularity_rank, and for budget or best value
+        filter price_bucket and ORDER BY bucket_rank. Never sort by avg_rating alone for these.
+        With product_ranked, filter the full-text index with product_rowid IN (SELECT rowid FROM product_fts ...).
         Create a single SQL query for the question provided. 
         The query should have all the fields in SELECT clause (i.e. SELECT *)
         
         Just the SQL query is needed, nothing more. Always provide the SQL in between the <SQL></SQL> tags.
         '''
-    chat_completion = groq_client.chat.completions.create(
+    chat_completion = await llm_gateway.complete(
         messages=[
             {
                 "role" : "system",
@@ -56,70 +88,123 @@ def generate_query(question):
                 "content": question,
             }
         ],
-        model=os.environ['GROQ_MODEL'],
+        model=llm_gateway.BIG_MODEL,
         temperature=0.3,
+        hedge=True,
     )
 
     return chat_completion.choices[0].message.content
 
-def summary_generation(recent_chats):
+async def asummary_generation(recent_chats):
     prompt = f'''
     generate the summary for this below conversations.
     keep only key facts and user intent:
     {recent_chats}
     '''
-    chat_completion = groq_client.chat.completions.create(
+    chat_completion = await llm_gateway.complete(
         messages=[
             {
                 "role": "user",
                 "content": prompt,
             }
         ],
-        model="llama-3.3-70b-versatile",
+        model=llm_gateway.BIG_MODEL,
+        priority=llm_gateway.BACKGROUND,
     )
     return chat_completion.choices[0].message.content
 
-def sql_chain(question):
-    global recent_chats,convo_summary
-    sql_query = generate_query(question)
-    pattern = "<SQL>(.*?)</SQL>"
-    matches = re.findall(pattern,sql_query,re.DOTALL)
-    if len(matches) == 0:
-        return "Sorry, LLM is not able to generate query for your question"
+async def asql_chain_stream(question, listing=None, summary="", recent_msgs=()):
+    response = None
+
+    # common product searches compile straight to SQL, the LLM only sees what they can't parse
+    with telemetry.span("sql_fast_path") as fast_span:
+        compiled = fast_sql.compile_query(question)
+        if compiled is not None:
+            response, cursor = await asyncio.to_thread(run_first_page, *compiled)
+            if response is not None and len(response) == 0:
+                response = None
+        fast_span.tag(hit=response is not None)
+    fast_sql.record(response is not None)
+
+    # questions that differ from an earlier one only in numbers and brands reuse its SQL
+    if response is None:
+        with telemetry.span("sql_template") as template_span:
+            template = await asyncio.to_thread(sql_templates.lookup, question)
+            if template is not None:
+                try:
+                    response, cursor = await asyncio.to_thread(run_first_page, *template)
+                except Exception as e:
+                    print(f"sql template failed: {e}")
+                    response = None
+                if response is not None and len(response) == 0:
+                    response = None
+            template_span.tag(hit=response is not None)
 
-    print(matches[0])
-    response = run_query(matches[0])
     if response is None:
-        return "Sorry there was a problem in executing the query"
-    response = response[:4]
-    final_data = response.to_dict(orient='records')
+        with telemetry.span("sql_generate"):
+            sql_query = await agenerate_query(question)
+        pattern = "<SQL>(.*?)</SQL>"
+        matches = re.findall(pattern,sql_query,re.DOTALL)
+        if len(matches) == 0:
+            yield "Sorry, LLM is not able to generate query for your question"
+            return
+
+        print(matches[0])
+        with telemetry.span("sql_exec"):
+            response, cursor = await asyncio.to_thread(run_first_page, matches[0])
+        if response is None:
+            yield "Sorry there was a problem in executing the query"
+            return
+        try:
+            await asyncio.to_thread(sql_templates.store, question, matches[0])
+        except Exception as e:
+            print(f"sql template not stored: {e}")
+    final_data = response
+
+    # "show more" continues from here without the router or the LLM
+    if listing is not None:
+        listing.clear()
+        if len(response) == Max_Results:
+            listing["cursor"] = cursor
+
+    async for token in afinal_answer_generation_stream(question,final_data,summary=summary,recent_msgs=recent_msgs):
+        yield token
 
-    final_answer = final_answer_generation(question,final_data,summary=convo_summary,chat_history = "\n".join(recent_chats))
+async def asql_chain(question, listing=None, summary="", recent_msgs=()):
+    return await streaming.collect(asql_chain_stream(question, listing, summary, recent_msgs))
 
-    recent_chats.append(f"user:{question}")
-    recent_chats.append(f"assistant:{final_answer}")
+def prime_listing(question, listing):
+    # a cached answer skipped sql_chain, rebuild the cursor when the fast path can
+    compiled = fast_sql.compile_query(question)
+    listing.clear()
+    if compiled is not None:
+        response, cursor = run_first_page(*compiled)
+        if len(response) == Max_Results:
+            listing["cursor"] = cursor
 
-    if len(recent_chats) > Summary_trigger:
-        summary = summary_generation(recent_chats)
-        convo_summary = convo_summary + "\n" + summary
-        recent_chats = recent_chats[-Max_Chat_Size*2:]
-    return final_answer
+def more_results(listing):
+    cursor = listing.get("cursor")
+    if cursor is None:
+        return "That's all the products I found for your last search."
 
-def final_answer_generation(question,data,summary,chat_history):
-    final_prompt=f'''
+    rows, next_cursor = pagination.next_page(cursor, page_size=Max_Results)
+    if len(rows) < Max_Results:
+        listing.clear()
+    else:
+        listing["cursor"] = next_cursor
+    if not rows:
+        return "That's all the products I found for your last search."
+    return pagination.render(rows, start=cursor["shown"] + 1)
+
+async def afinal_answer_generation_stream(question,data,summary="",recent_msgs=()):
+    # no per-call values in here, the provider caches this prefix across calls
+    final_prompt='''
     You are an expert in understanding the context of the question and replying based on the data pertaining to the question provided.
     You will be provided with Question: and Data:. The data will be in the form of an array or a dataframe or dict. 
     Reply based on only the data provided as Data for answering the question asked as Question. Do not write anything like 'Based on the data' or any other technical words. 
     Just a plain simple natural language response.
     The Data would always be in context to the question asked. 
-    summary of previous convertion:
-    {summary}
-    
-    chat history:
-    {chat_history}
-    
-    Question:
-    {question}
+    A summary of the previous conversation and the chat history may come before the Question:, use them only to understand follow-up questions.
     
     For example is the question is “What is the average rating?” and data is “4.3”, then answer should be “The average rating for the product is 4.3”. 
     So make sure the response is curated with the question and data. Make sure to note the column names to have some context, if needed, for your response.
@@ -131,23 +216,48 @@ def final_answer_generation(question,data,summary,chat_history):
     2. Campus Women Running Shoes: Rs. 1104 (35 percent off), Rating: 4.4 <link>
     3. Campus Women Running Shoes: Rs. 1104 (35 percent off), Rating: 4.4 <link>
     '''
-    chat_completion = groq_client.chat.completions.create(
-        messages=[
-            {
-                "role": "system",
-                "content": final_prompt,
-            },
-            {
-                "role": "user",
-                "content": f"Question:{question},Data:{data}",
-            }
-        ],
-        model=os.environ['GROQ_MODEL'],
-        temperature=0.3,
+    model = llm_gateway.pick_model("sql")
+    messages, estimated = await asyncio.to_thread(
+        prompt_builder.build,
+        final_prompt,
+        f"Question:{question},Data:{data}",
+        model=model,
+        query=question,
+        summary=summary,
+        recent_msgs=recent_msgs,
     )
+    usage = []
+    async for token in llm_gateway.stream(
+        on_usage=usage.append,
+        messages=messages,
+        model=model,
+        temperature=0.3,
+    ):
+        yield token
+    prompt_builder.record("sql_answer", estimated, usage[-1] if usage else None)
 
-    return chat_completion.choices[0].message.content
+async def afinal_answer_generation(question,data,summary="",recent_msgs=()):
+    return await streaming.collect(afinal_answer_generation_stream(question,data,summary,recent_msgs))
+
+# blocking wrappers for callers outside the event loop
+def generate_query(question):
+    return aio.run(agenerate_query(question))
+
+def summary_generation(recent_chats):
+    return aio.run(asummary_generation(recent_chats))
+
+def sql_chain(question, listing=None, summary="", recent_msgs=()):
+    return aio.run(asql_chain(question, listing, summary, recent_msgs))
+
+def sql_chain_stream(question, listing=None, summary="", recent_msgs=()):
+    return streaming.iterate(asql_chain_stream(question, listing, summary, recent_msgs))
+
+def final_answer_generation(question,data,summary="",recent_msgs=()):
+    return aio.run(afinal_answer_generation(question,data,summary,recent_msgs))
 
 if __name__ == "__main__":
+    import catalog
+    # the generated SQL reads product_fts and product_ranked, which prepare_catalog creates
+    catalog.prepare_catalog()
     question = "give me highly rated products"
     print(sql_chain(question))
@@ -0,0 +1,163 @@
+"""SQL path at catalog scale, on synthetic catalogs from catalog_gen.
+
+Replays statements shaped like the ones the LLM writes through db_pool.execute, the
+call sql.run_query makes, once on the bare table and once after catalog.prepare_catalog
+added the indexes, product_fts and the ranking tables:
+
+    python sql_bench.py --sizes 10000,100000,1000000 --repeats 5
+
+Catalogs are kept in bench_results/catalogs/ and reused on the next run.
+"""
+import argparse
+import json
+import re
+import sqlite3
+import time
+import tracemalloc
+from pathlib import Path
+
+import benchmark
+import catalog
+import catalog_gen
+import db_pool
+import loadgen
+
+
+catalogs_dir = benchmark.results_dir / "catalogs"
+
+STATEMENTS = {
+    "brand_like": "SELECT * FROM product WHERE brand LIKE '%puma%' ORDER BY avg_rating DESC",
+    "brand_exact": "SELECT * FROM product WHERE LOWER(brand) = 'puma' AND price < 3000 ORDER BY price",
+    "brand_match": "SELECT * FROM product WHERE rowid IN "
+                   "(SELECT rowid FROM product_fts WHERE product_fts MATCH 'brand:puma AND title:shoes') "
+                   "ORDER BY price",
+    "title_like": "SELECT * FROM product WHERE title LIKE '%shoes%' AND price BETWEEN 1000 AND 3000",
+    "price_range": "SELECT * FROM product WHERE price BETWEEN 1000 AND 2000 ORDER BY avg_rating DESC",
+    "top_rated": "SELECT * FROM product WHERE avg_rating >= 4.5 ORDER BY avg_rating DESC, total_ratings DESC",
+    "most_reviewed": "SELECT * FROM product ORDER BY total_ratings DESC",
+    "brand_average": "SELECT brand, AVG(price) AS avg_price FROM product GROUP BY brand ORDER BY avg_price DESC",
+    "top_ranked": "SELECT * FROM product_ranked ORDER BY score_rank",
+    "budget_ranked": "SELECT * FROM product_ranked WHERE price_bucket = 1 ORDER BY bucket_rank",
+}
+# statements on tables that only exist once prepare_catalog ran
+NEEDS_PREPARE = {"brand_match", "top_ranked", "budget_ranked"}
+
+
+def drop_indexes(path):
+    """Take a catalog back to the bare product table."""
+    with sqlite3.connect(path) as conn:
+        for kind, name in conn.execute(
+            "SELECT type, name FROM sqlite_master WHERE type IN ('index', 'trigger', 'view') AND sql IS NOT NULL"
+        ).fetchall():
+            conn.execute(f"DROP {kind.upper()} IF EXISTS {name}")
+        for table in ("product_fts", "product_rank", "ranking_meta", "catalog_changes"):
+            conn.execute(f"DROP TABLE IF EXISTS {table}")
+        conn.execute("DROP TABLE IF EXISTS sqlite_stat1")
+    with sqlite3.connect(path) as conn:
+        conn.execute("VACUUM")
+
+
+def plan(statement):
+    with db_pool.connection() as conn:
+        return [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {statement}")]
+
+
+def measure(statement, repeats):
+    tracemalloc.start()
+    rss = loadgen.rss_mb()
+    start = time.perf_counter()
+    rows = db_pool.execute(statement)
+    cold = (time.perf_counter() - start) * 1000
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        db_pool.execute(statement)
+        times.append((time.perf_counter() - start) * 1000)
+    return {
+        "rows": len(rows),
+        "cold_ms": round(cold, 2),
+        "ms": benchmark.percentiles(times),
+        "python_peak_kb": round(peak / 1024, 1),
+        "rss_growth_mb": round(loadgen.rss_mb() - rss, 1),
+        "plan": plan(statement),
+    }
+
+
+def run_mode(path, repeats, indexed):
+    db_pool.close_all()
+    db_pool.sqldb_path = path
+    results = {}
+    for name, statement in STATEMENTS.items():
+        if name in NEEDS_PREPARE and not indexed:
+            continue
+        results[name] = measure(statement, repeats)
+    db_pool.close_all()
+    return results
+
+
+def run_size(size, repeats, seed=0, regenerate=False, report=print):
+    path = catalogs_dir / f"product-{size}.sqlite"
+    built = None
+    if regenerate or not path.exists():
+        report(f"generating {size} rows")
+        built = catalog_gen.generate(path, size, seed)
+    else:
+        drop_indexes(path)
+
+    result = {"rows": size, "generated": built, "mb": round(path.stat().st_size / 2**20, 1)}
+    result["plain"] = run_mode(path, repeats, indexed=False)
+
+    start = time.perf_counter()
+    catalog.prepare_catalog(path)
+    result["index_seconds"] = round(time.perf_counter() - start, 1)
+    result["indexed_mb"] = round(path.stat().st_size / 2**20, 1)
+    result["indexed"] = run_mode(path, repeats, indexed=True)
+    return result
+
+
+def _print(sizes):
+    print(f"\n{'statement':<14} {'rows':>10} {'plain p50':>10} {'indexed p50':>12} {'speedup':>8} {'py KB':>8}")
+    for size in sizes:
+        for name in STATEMENTS:
+            indexed = size["indexed"].get(name)
+            plain = size["plain"].get(name)
+            after = indexed["ms"]["p50"] if indexed else None
+            before = plain["ms"]["p50"] if plain else None
+            speedup = f"{before / after:.1f}x" if before and after else "-"
+            print(f"{name:<14} {size['rows']:>10} {before if before is not None else '-':>10} "
+                  f"{after if after is not None else '-':>12} {speedup:>8} {indexed['python_peak_kb']:>8}")
+        print(f"{'':<14} {size['rows']:>10} {size['mb']} MB, indexes +{size['indexed_mb'] - size['mb']:.1f} MB"
+              f" in {size['index_seconds']}s")
+
+
+def main(args):
+    sizes = []
+    for size in args.sizes:
+        sizes.append(run_size(size, args.repeats, args.seed, args.regenerate))
+
+    _print(sizes)
+    result = {
+        "commit": benchmark._commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": {k: v for k, v in vars(args).items() if k != "out"},
+        "statements": STATEMENTS,
+        "sizes": sizes,
+    }
+    out = args.out or benchmark.results_dir / f"sql-{result['commit']}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(result, indent=2, default=str))
+    print(f"saved {out}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=lambda s: [int(n) for n in re.split(r"[, ]+", s) if n],
+                        default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--regenerate", action="store_true", help="rebuild cached catalogs")
+    parser.add_argument("--out", type=Path, help="defaults to bench_results/sql-<commit>.json")
+    main(parser.parse_args())
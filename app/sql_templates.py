@@ -0,0 +1,274 @@
+import os
+import re
+import threading
+from collections import OrderedDict
+
+import db_pool
+import fast_sql
+import telemetry
+
+
+MAX_ENTRIES = int(os.environ.get("SQL_TEMPLATE_CACHE_SIZE", 256))
+
+_QUESTION_TOKEN = re.compile(rf"{fast_sql.AMOUNT}|[a-z0-9]+")
+_SQL_TOKEN = re.compile(r"'(?:[^']|'')*'|\d+(?:\.\d+)?|[a-z_][a-z0-9_]*|\s+|.", re.IGNORECASE)
+_SLOT = re.compile(r"\{([bn]\d+)(?::(key|raw))?(?::(lower|upper|title))?\}")
+
+# longest brand name tried at a position, in words
+BRAND_WORDS = 4
+
+_entries = OrderedDict()
+_lock = threading.Lock()
+_schema_version = None
+
+counters = {"hits": 0, "misses": 0, "stores": 0, "rejected": 0, "evictions": 0, "invalidations": 0}
+
+
+def _number(text, unit):
+    value = float(text) * fast_sql.UNITS.get(unit or "", 1)
+    return int(value) if value.is_integer() else value
+
+
+def templatize(question):
+    """(template, values) for a question, numbers become {n0}.. and brands {b0}..
+
+    "Nike shoes below 5k" gives ("{b0} shoes below {n0}", {"b0": "nike", "n0": 5000}).
+    """
+    q = question.lower().replace(",", "")
+    tokens = []
+    for match in _QUESTION_TOKEN.finditer(q):
+        if match.group(1) is not None:
+            tokens.append(("n", _number(match.group(1), match.group(2))))
+        else:
+            tokens.append(("w", match.group(0)))
+
+    brands = fast_sql.known_brands()
+    words, values = [], {}
+    i = 0
+    while i < len(tokens):
+        kind, value = tokens[i]
+        if kind == "n":
+            slot = f"n{sum(k.startswith('n') for k in values)}"
+            values[slot] = value
+            words.append("{" + slot + "}")
+            i += 1
+            continue
+        for size in range(BRAND_WORDS, 0, -1):
+            span = tokens[i:i + size]
+            if len(span) == size and all(k == "w" for k, _ in span):
+                name = " ".join(v for _, v in span)
+                if name in brands:
+                    slot = f"b{sum(k.startswith('b') for k in values)}"
+                    values[slot] = name
+                    words.append("{" + slot + "}")
+                    i += size
+                    break
+        else:
+            words.append(value)
+            i += 1
+    return " ".join(words), values
+
+
+def _text(value):
+    return str(value)
+
+
+def _case(text):
+    if text.islower() or not any(c.isalpha() for c in text):
+        return "lower"
+    if text.isupper():
+        return "upper"
+    if text.istitle():
+        return "title"
+    return None
+
+
+def _forms(slot, value):
+    """The spellings of a placeholder value to look for in SQL, with their slot marker."""
+    if slot.startswith("n"):
+        return [(_text(value), "{" + slot + "}")]
+    forms = [(value, "{" + slot + ":key")]
+    forms += [(raw, "{" + slot + ":raw") for raw in fast_sql.known_brands()[value] if raw != value]
+    return forms
+
+
+def _template_literal(literal, values):
+    """`literal` with the placeholder values in it replaced by slots, and the slots used."""
+    used = set()
+    for slot, value in values.items():
+        for form, marker in sorted(_forms(slot, value), key=lambda f: -len(f[0])):
+            pattern = re.compile(rf"(?<![a-z0-9.]){re.escape(form)}(?![a-z0-9])", re.IGNORECASE)
+
+            def replace(match):
+                if marker.endswith("}"):
+                    used.add(slot)
+                    return marker
+                case = _case(match.group(0))
+                if case is None:
+                    raise ValueError(f"unsupported casing {match.group(0)!r}")
+                used.add(slot)
+                return f"{marker}:{case}}}"
+
+            literal = pattern.sub(replace, literal)
+    return literal, used
+
+
+def _case_insensitive(words):
+    """Whether a string literal after `words` is compared without regard to case.
+
+    Brands are only known lowercased, so a literal compared as written, like
+    brand = 'NIKE', cannot be refilled with the real spelling of another brand.
+    """
+    if words[-1:] in (["match"], ["like"]):
+        return True
+    i = len(words) - 1
+    while i >= 0 and (words[i] in ("(", ",") or words[i].startswith("'")):
+        i -= 1
+    if i < 0 or words[i] not in ("=", "in"):
+        return False
+    column = words[:i]
+    return len(column) >= 4 and column[-4] in ("lower", "upper") and column[-3] == "(" and column[-1] == ")"
+
+
+def parameterize(statement, values):
+    """(statement with ? placeholders, recipes for its parameters), None if unsafe.
+
+    Every placeholder value must show up in the SQL, as a number or inside a string, or
+    reusing it for another value of the same shape would be wrong. Brands must be
+    compared case-insensitively, through LOWER(), LIKE or the full-text index.
+    """
+    numbers = [v for k, v in values.items() if k.startswith("n")]
+    if len(set(numbers)) != len(numbers):
+        return None
+
+    parts, recipes, used = [], [], set()
+    previous = []
+    for token in _SQL_TOKEN.findall(statement.strip().rstrip(";")):
+        words = [w.lower() for w in previous if not w.isspace()]
+        after_limit = words and (words[-1] in ("limit", "offset") or words[-2:-1] == ["limit"] and words[-1] == ",")
+        if token[0].isdigit() and not after_limit:
+            slot = next((k for k, v in values.items() if k.startswith("n") and float(token) == float(v)), None)
+            if slot is not None:
+                parts.append("?")
+                recipes.append("{" + slot + "}")
+                used.add(slot)
+            else:
+                parts.append(token)
+        elif token.startswith("'") and len(token) > 1:
+            try:
+                literal, slots = _template_literal(token[1:-1].replace("''", "'"), values)
+            except ValueError:
+                return None
+            if slots and any(slot.startswith("b") for slot in slots) and not _case_insensitive(words):
+                return None
+            if slots:
+                parts.append("?")
+                recipes.append(literal)
+                used |= slots
+            else:
+                parts.append(token)
+        else:
+            parts.append(token)
+        previous.append(token)
+
+    if used != set(values):
+        return None
+    return "".join(parts), recipes
+
+
+def render(recipe, values):
+    whole = _SLOT.fullmatch(recipe)
+    if whole is not None and whole.group(1).startswith("n"):
+        return values[whole.group(1)]
+
+    def fill(match):
+        slot, form, case = match.groups()
+        value = values[slot]
+        if slot.startswith("n"):
+            return _text(value)
+        if form == "raw":
+            value = fast_sql.known_brands()[value][0]
+        return {"lower": value.lower(), "upper": value.upper(), "title": value.title()}[case or "lower"]
+
+    return _SLOT.sub(fill, recipe)
+
+
+def schema_version():
+    return db_pool.execute("PRAGMA schema_version", limit=None)[0]["schema_version"]
+
+
+def _check_schema():
+    """Drop every entry once the database schema changed."""
+    global _schema_version
+    version = schema_version()
+    with _lock:
+        if version != _schema_version:
+            if _entries:
+                counters["invalidations"] += len(_entries)
+                print(f"sql template cache cleared, schema version {_schema_version} -> {version}")
+            _entries.clear()
+            _schema_version = version
+
+
+def _validate(statement, params):
+    with db_pool.connection() as conn:
+        conn.execute(f"EXPLAIN {statement}", params).fetchall()
+
+
+def lookup(question):
+    """(statement, params) stored for a question of the same shape, or None."""
+    template, values = templatize(question)
+    _check_schema()
+    with _lock:
+        entry = _entries.get(template)
+        if entry is None or set(entry["slots"]) != set(values):
+            counters["misses"] += 1
+            telemetry.count("sql_template_lookups_total", outcome="miss")
+            return None
+        _entries.move_to_end(template)
+        counters["hits"] += 1
+    telemetry.count("sql_template_lookups_total", outcome="hit")
+    return entry["statement"], tuple(render(recipe, values) for recipe in entry["recipes"])
+
+
+def store(question, statement):
+    """Keep the SQL generated for `question` as a template, if it can be parameterized safely."""
+    if not statement.strip().upper().startswith("SELECT"):
+        return False
+    template, values = templatize(question)
+    parameterized = parameterize(statement, values)
+    if parameterized is None:
+        with _lock:
+            counters["rejected"] += 1
+        return False
+
+    statement, recipes = parameterized
+    params = tuple(render(recipe, values) for recipe in recipes)
+    _check_schema()
+    try:
+        _validate(statement, params)
+    except Exception as e:
+        print(f"sql template rejected: {e}")
+        with _lock:
+            counters["rejected"] += 1
+        return False
+
+    with _lock:
+        _entries[template] = {"statement": statement, "recipes": recipes, "slots": sorted(values)}
+        _entries.move_to_end(template)
+        counters["stores"] += 1
+        while len(_entries) > MAX_ENTRIES:
+            _entries.popitem(last=False)
+            counters["evictions"] += 1
+    return True
+
+
+def clear():
+    with _lock:
+        _entries.clear()
+
+
+def stats():
+    with _lock:
+        total = counters["hits"] + counters["misses"]
+        return {**counters, "entries": len(_entries), "hit_rate": counters["hits"] / total if total else 0.0}
@@ -0,0 +1,57 @@
+import time
+
+import aio
+import telemetry
+
+
+async def stream_completion(client, on_usage=None, **kwargs):
+    """Yield the content deltas of a streamed chat completion.
+
+    `on_usage` gets the token usage Groq sends with the last chunk.
+    """
+    with telemetry.span("llm", model=kwargs.get("model")) as llm_span:
+        start = time.perf_counter()
+        first = None
+        stream = await client.chat.completions.create(stream=True, **kwargs)
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                if first is None:
+                    first = time.perf_counter() - start
+                    llm_span.tag(ttft_ms=round(first * 1000, 1))
+                    telemetry.observe("llm_ttft_seconds", first, model=kwargs.get("model"))
+                yield chunk.choices[0].delta.content
+            x_groq = getattr(chunk, "x_groq", None)
+            if x_groq is not None and x_groq.usage is not None:
+                llm_span.tag(prompt_tokens=x_groq.usage.prompt_tokens,
+                             completion_tokens=x_groq.usage.completion_tokens)
+                if on_usage is not None:
+                    on_usage(x_groq.usage)
+
+
+async def collect(chunks):
+    return "".join([chunk async for chunk in chunks])
+
+
+def iterate(chunks):
+    """Consume an async generator from a plain thread, one item at a time, on the shared loop."""
+    try:
+        while True:
+            try:
+                yield aio.submit(chunks.__anext__()).result()
+            except StopAsyncIteration:
+                return
+    finally:
+        # the consumer stopped early, let the generator run its cleanup
+        aio.submit(chunks.aclose()).result()
+
+
+def timed(chunks, label, start=None):
+    """Pass `chunks` through and record the time to the first one, the turn span has the total."""
+    start = time.perf_counter() if start is None else start
+    first = None
+    for chunk in chunks:
+        if first is None:
+            first = time.perf_counter() - start
+            telemetry.observe("chat_ttft_seconds", first, route=label)
+            telemetry.tag_turn(ttft_ms=round(first * 1000, 2))
+        yield chunk
@@ -0,0 +1,167 @@
+import json
+import os
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+# seconds before the first token, then between tokens
+TTFT = float(os.environ.get("STUB_TTFT", 0.25))
+TOKEN_DELAY = float(os.environ.get("STUB_TOKEN_DELAY", 0.01))
+ANSWER_TOKENS = int(os.environ.get("STUB_ANSWER_TOKENS", 60))
+# relative spread of every delay, and a slow tail hit by a share of the requests
+JITTER = float(os.environ.get("STUB_JITTER", 0.2))
+TAIL_RATE = float(os.environ.get("STUB_TAIL_RATE", 0.0))
+TAIL_DELAY = float(os.environ.get("STUB_TAIL_DELAY", 2.0))
+# models the slow tail applies to, all of them when empty
+TAIL_MODELS = {m.strip() for m in os.environ.get("STUB_TAIL_MODELS", "").split(",") if m.strip()}
+
+ANSWER = (
+    "Here are a few options that match what you asked for. Each one is listed with its price, "
+    "rating and a link so you can compare them quickly and pick the one that suits you best. "
+)
+SUMMARY = "The user is shopping and asked about products, prices and store policies."
+
+counters = {"requests": 0, "streamed": 0, "tail": 0}
+_lock = threading.Lock()
+
+
+def _delay(seconds):
+    return max(0.0, seconds * random.uniform(1 - JITTER, 1 + JITTER))
+
+
+def canned_reply(messages):
+    """The text the stub answers with, picked from what the prompt asks for."""
+    prompt = "\n".join(str(m.get("content", "")) for m in messages)
+    question = str(messages[-1].get("content", "")) if messages else ""
+
+    if "<SQL></SQL>" in prompt:
+        numbers = re.findall(r"\d+", question.replace(",", ""))
+        if numbers:
+            return f"<SQL>SELECT * FROM product WHERE price <= {numbers[0]} ORDER BY avg_rating DESC</SQL>"
+        return "<SQL>SELECT * FROM product WHERE avg_rating >= 4 ORDER BY total_ratings DESC</SQL>"
+    if re.match(r"\s*(generate the summary|summarize)", prompt.lower()):
+        return SUMMARY
+
+    words = (ANSWER * (ANSWER_TOKENS // len(ANSWER.split()) + 1)).split()
+    return " ".join(words[:ANSWER_TOKENS])
+
+
+def _tokens(text):
+    return re.findall(r"\S+\s*", text)
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _chunk(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+    def do_POST(self):
+        try:
+            self._complete()
+        except (BrokenPipeError, ConnectionResetError):
+            # the client gave up on the call, a cancelled hedge or stream
+            pass
+
+    def _complete(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": f"unknown path {self.path}"}})
+            return
+
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        messages = request.get("messages", [])
+        model = request.get("model", "stub")
+        text = canned_reply(messages)
+        tokens = _tokens(text)
+        usage = {
+            "prompt_tokens": sum(len(str(m.get("content", ""))) for m in messages) // 4,
+            "completion_tokens": len(tokens),
+        }
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+
+        wait = _delay(TTFT)
+        with _lock:
+            counters["requests"] += 1
+            if TAIL_RATE and (not TAIL_MODELS or model in TAIL_MODELS) and random.random() < TAIL_RATE:
+                counters["tail"] += 1
+                wait += _delay(TAIL_DELAY)
+        time.sleep(wait)
+
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        created = int(time.time())
+        if not request.get("stream"):
+            time.sleep(sum(_delay(TOKEN_DELAY) for _ in tokens))
+            self._send_json(200, {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": text},
+                             "finish_reason": "stop"}],
+                "usage": usage,
+            })
+            return
+
+        with _lock:
+            counters["streamed"] += 1
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for i, token in enumerate(tokens):
+            if i:
+                time.sleep(_delay(TOKEN_DELAY))
+            chunk = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": {"role": "assistant", "content": token}, "finish_reason": None}],
+            }
+            self._chunk(f"data: {json.dumps(chunk)}\n\n".encode())
+        last = {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": created,
+            "model": model,
+            "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+            "x_groq": {"id": completion_id, "usage": usage},
+        }
+        self._chunk(f"data: {json.dumps(last)}\n\n".encode())
+        self._chunk(b"data: [DONE]\n\n")
+        self._chunk(b"")
+
+
+def start(port=0):
+    """Serve the stub from a daemon thread, returns the server, its base URL is server.base_url."""
+    server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    server.daemon_threads = True
+    server.base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    threading.Thread(target=server.serve_forever, name="stub-llm", daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    port = int(os.environ.get("STUB_PORT", 8099))
+    server = start(port)
+    print(f"stub Groq API on {server.base_url}, set GROQ_BASE_URL to use it")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,151 @@
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+
+import aio
+import telemetry
+
+
+QUEUE_SIZE = int(os.environ.get("SUMMARY_QUEUE_SIZE", 64))
+WORKERS = int(os.environ.get("SUMMARY_WORKERS", 2))
+# triggers for the same session inside this window are folded into one LLM call
+DEBOUNCE = float(os.environ.get("SUMMARY_DEBOUNCE", 2.0))
+
+_queue = None
+_lock = threading.Lock()
+# session key -> {"messages", "summarize", "since", "queued"}
+_pending = {}
+# session key -> summaries finished but not merged yet
+_ready = {}
+# sessions being summarized right now, and those discarded meanwhile
+_running = set()
+_discarded = set()
+_lags = deque(maxlen=200)
+
+counters = {"requested": 0, "debounced": 0, "deferred": 0, "completed": 0, "failed": 0}
+
+
+def request(key, messages, summarize):
+    """Fold `messages` into the summary of session `key` in the background.
+
+    `summarize` is the async LLM call taking the list of messages. Returns immediately,
+    the result is picked up by the next merge() for the same key.
+    """
+    if not messages:
+        return
+    with _lock:
+        counters["requested"] += 1
+        job = _pending.get(key)
+        if job is not None:
+            job["messages"].extend(messages)
+            job["summarize"] = summarize
+            counters["debounced"] += 1
+            if job["queued"]:
+                return
+        else:
+            _pending[key] = {"messages": list(messages), "summarize": summarize,
+                             "since": time.monotonic(), "queued": False}
+    aio.get_loop().call_soon_threadsafe(_enqueue, key)
+
+
+def merge(key, summary):
+    """`summary` with every summary finished for `key` since the last merge appended."""
+    with _lock:
+        pieces = _ready.pop(key, [])
+    for piece in pieces:
+        summary = f"{summary}\n{piece}" if summary else piece
+    return summary
+
+
+def discard(key):
+    """Forget everything pending or finished for `key`, for sessions that no longer exist."""
+    with _lock:
+        _pending.pop(key, None)
+        _ready.pop(key, None)
+        if key in _running:
+            _discarded.add(key)
+
+
+def _enqueue(key):
+    global _queue
+    if _queue is None:
+        _queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        for _ in range(WORKERS):
+            asyncio.get_running_loop().create_task(_worker())
+    with _lock:
+        job = _pending.get(key)
+        if job is None or job["queued"]:
+            return
+        try:
+            _queue.put_nowait(key)
+        except asyncio.QueueFull:
+            # the messages stay pending and go out with the next trigger for this session
+            counters["deferred"] += 1
+            return
+        job["queued"] = True
+        telemetry.gauge("summary_queue_depth", _queue.qsize())
+
+
+async def _worker():
+    while True:
+        key = await _queue.get()
+        try:
+            with _lock:
+                if key not in _pending:
+                    continue
+                due = _pending[key]["since"] + DEBOUNCE
+            await asyncio.sleep(max(due - time.monotonic(), 0))
+
+            with _lock:
+                job = _pending.pop(key, None)
+                if job is None:
+                    continue
+                _running.add(key)
+            try:
+                with telemetry.span("summary"):
+                    summary = await job["summarize"](job["messages"])
+            except Exception as e:
+                print(f"summary for {key} failed: {e}")
+                with _lock:
+                    counters["failed"] += 1
+                    _running.discard(key)
+                    if key in _discarded:
+                        _discarded.discard(key)
+                        continue
+                    # put the messages back in front of anything queued meanwhile
+                    retry = _pending.get(key)
+                    if retry is None:
+                        _pending[key] = dict(job, queued=False)
+                    else:
+                        retry["messages"][:0] = job["messages"]
+                continue
+
+            lag = time.monotonic() - job["since"]
+            with _lock:
+                _running.discard(key)
+                counters["completed"] += 1
+                _lags.append(lag)
+                if key in _discarded:
+                    _discarded.discard(key)
+                    continue
+                _ready.setdefault(key, []).append(summary)
+            telemetry.observe("summary_lag_seconds", lag)
+            telemetry.gauge("summary_queue_depth", _queue.qsize())
+            print(f"summary for {key} ready after {lag:.1f}s, queue depth {_queue.qsize()}")
+        finally:
+            _queue.task_done()
+
+
+def stats():
+    with _lock:
+        lags = sorted(_lags)
+        return {
+            **counters,
+            "queue_depth": _queue.qsize() if _queue is not None else 0,
+            "pending_sessions": len(_pending),
+            "unmerged": sum(len(pieces) for pieces in _ready.values()),
+            "lag_p50_s": round(lags[len(lags) // 2], 3) if lags else None,
+            "lag_max_s": round(lags[-1], 3) if lags else None,
+        }
@@ -0,0 +1,228 @@
+import bisect
+import contextvars
+import json
+import os
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+ENABLED = os.environ.get("TELEMETRY", "0").lower() in ("1", "true", "yes", "on")
+# Prometheus text is rewritten here after every turn, and served on the port when set
+METRICS_FILE = os.environ.get("TELEMETRY_METRICS_FILE", "")
+METRICS_PORT = int(os.environ.get("TELEMETRY_PORT", 0))
+# one JSON line per turn with all of its spans
+TRACE_FILE = os.environ.get("TELEMETRY_TRACE_FILE", "")
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+_lock = threading.Lock()
+_counters = {}
+_gauges = {}
+_histograms = {}
+_collectors = {}
+_server = None
+
+_trace = contextvars.ContextVar("telemetry_trace", default=None)
+
+
+def _key(name, labels):
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items() if v is not None))
+
+
+def count(name, value=1, **labels):
+    if not ENABLED:
+        return
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def gauge(name, value, **labels):
+    if not ENABLED:
+        return
+    with _lock:
+        _gauges[_key(name, labels)] = value
+
+
+def observe(name, seconds, **labels):
+    if not ENABLED:
+        return
+    key = _key(name, labels)
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = {"buckets": [0] * len(BUCKETS), "sum": 0.0, "count": 0}
+        index = bisect.bisect_left(BUCKETS, seconds)
+        if index < len(BUCKETS):
+            histogram["buckets"][index] += 1
+        histogram["sum"] += seconds
+        histogram["count"] += 1
+
+
+def register(name, collect):
+    """Export the numbers in the dict `collect()` returns as `<name>_<key>` gauges."""
+    _collectors[name] = collect
+
+
+class _NoSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def tag(self, **tags):
+        pass
+
+
+_NO_SPAN = _NoSpan()
+
+
+class Span:
+    # tags that become metric labels, everything else only goes to the trace
+    LABELS = ("route", "cache", "model")
+
+    def __init__(self, name, tags):
+        self.name = name
+        self.tags = tags
+
+    def tag(self, **tags):
+        self.tags.update(tags)
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        seconds = time.perf_counter() - self.start
+        outcome = "ok" if exc_type is None else "error"
+        labels = {k: v for k, v in self.tags.items() if k in self.LABELS}
+        observe("chat_stage_seconds", seconds, stage=self.name, **labels)
+        if exc_type is not None and not issubclass(exc_type, GeneratorExit):
+            count("chat_stage_errors_total", stage=self.name, error=exc_type.__name__)
+
+        trace = _trace.get()
+        if trace is not None:
+            record = {"stage": self.name, "ms": round(seconds * 1000, 2), "outcome": outcome, **self.tags}
+            if exc is not None:
+                record["error"] = repr(exc)[:300]
+            with _lock:
+                trace["spans"].append(record)
+        return False
+
+
+def span(name, **tags):
+    """Time a stage of the current turn, a no-op when telemetry is off."""
+    if not ENABLED:
+        return _NO_SPAN
+    return Span(name, tags)
+
+
+def tag_turn(**tags):
+    """Tags for the whole turn, like the route once it is known."""
+    trace = _trace.get()
+    if trace is not None:
+        trace["tags"].update(tags)
+
+
+class _Turn(Span):
+    def __enter__(self):
+        self.trace = {"id": uuid.uuid4().hex[:12], "tags": self.tags, "spans": []}
+        self.token = _trace.set(self.trace)
+        return super().__enter__()
+
+    def __exit__(self, exc_type, exc, tb):
+        super().__exit__(exc_type, exc, tb)
+        _trace.reset(self.token)
+        self.trace["ms"] = round((time.perf_counter() - self.start) * 1000, 2)
+        if TRACE_FILE:
+            with _lock, open(TRACE_FILE, "a") as f:
+                f.write(json.dumps(self.trace, default=str) + "\n")
+        if METRICS_FILE:
+            dump(METRICS_FILE)
+        return False
+
+
+def turn(**tags):
+    """Span around a whole chat turn, spans started inside it are collected into its trace."""
+    if not ENABLED:
+        return _NO_SPAN
+    return _Turn("turn", tags)
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in labels) + "}"
+
+
+def render():
+    """All metrics in the Prometheus text format."""
+    lines = []
+    with _lock:
+        counters = dict(_counters)
+        gauges = dict(_gauges)
+        histograms = {key: dict(value, buckets=list(value["buckets"])) for key, value in _histograms.items()}
+
+    for name, collect in list(_collectors.items()):
+        try:
+            values = collect()
+        except Exception as e:
+            print(f"telemetry collector {name} failed: {e}")
+            continue
+        for field, value in values.items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                gauges[(f"{name}_{field}", ())] = value
+
+    for (name, labels), value in sorted(counters.items()):
+        lines.append(f"{name}{_labels(labels)} {value}")
+    for (name, labels), value in sorted(gauges.items()):
+        lines.append(f"{name}{_labels(labels)} {value}")
+    for (name, labels), histogram in sorted(histograms.items()):
+        cumulative = 0
+        for bound, hits in zip(BUCKETS, histogram["buckets"]):
+            cumulative += hits
+            lines.append(f"{name}_bucket{_labels(labels + (('le', str(bound)),))} {cumulative}")
+        lines.append(f"{name}_bucket{_labels(labels + (('le', '+Inf'),))} {histogram['count']}")
+        lines.append(f"{name}_sum{_labels(labels)} {round(histogram['sum'], 6)}")
+        lines.append(f"{name}_count{_labels(labels)} {histogram['count']}")
+    return "\n".join(lines) + "\n"
+
+
+def dump(path):
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        f.write(render())
+    os.replace(tmp, path)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        data = render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def start(port=METRICS_PORT):
+    """Serve /metrics from a daemon thread, once per process. Nothing happens when off."""
+    global _server
+    if not ENABLED or not port:
+        return None
+    with _lock:
+        if _server is None:
+            _server = ThreadingHTTPServer(("0.0.0.0", port), _MetricsHandler)
+            _server.daemon_threads = True
+            threading.Thread(target=_server.serve_forever, name="telemetry", daemon=True).start()
+            print(f"metrics on http://0.0.0.0:{port}/metrics")
+    return _server
@@ -0,0 +1,114 @@
+import csv
+import hashlib
+import os
+from pathlib import Path
+
+import chromadb
+
+
+chroma_path = Path(os.environ.get("CHROMA_PATH", Path(__file__).parent / "chroma_store"))
+# "chroma" searches through the Chroma client, "numpy" through np_index in process
+VECTOR_INDEX = os.environ.get("VECTOR_INDEX", "chroma")
+
+_client = None
+_collections = {}
+
+
+def get_client():
+    global _client
+    if _client is None:
+        _client = chromadb.PersistentClient(path=str(chroma_path))
+    return _client
+
+
+def row_id(question):
+    # ids follow the question text, so an edited question is a delete plus an add
+    return "q_" + hashlib.sha1(question.strip().encode("utf-8")).hexdigest()[:16]
+
+
+def content_hash(question, answer):
+    return hashlib.sha256(f"{question.strip()}\x1f{answer.strip()}".encode("utf-8")).hexdigest()
+
+
+def _open_collection(name, ef):
+    client = get_client()
+    model_name = getattr(ef, "model_tag", getattr(ef, "model_name", ""))
+
+    if name in [collection.name for collection in client.list_collections()]:
+        try:
+            collection = client.get_collection(name=name, embedding_function=ef)
+            if (collection.metadata or {}).get("embedding_model") == model_name:
+                return collection
+        except ValueError:
+            pass
+        # stored vectors come from another model, they cannot be compared with new queries
+        print(f"{name} was embedded with a different model, rebuilding")
+        client.delete_collection(name)
+
+    return client.create_collection(
+        name=name,
+        embedding_function=ef,
+        metadata={"embedding_model": model_name},
+    )
+
+
+def get_collection(name, ef):
+    collection = _collections.get(name)
+    if collection is None:
+        collection = _collections[name] = get_client().get_collection(name=name, embedding_function=ef)
+    return collection
+
+
+def query(name, ef, query_texts, n_results=2):
+    """Nearest rows of collection `name`, in the shape of a Chroma query result."""
+    if VECTOR_INDEX == "numpy":
+        import np_index
+        return np_index.get(name, ef).query(query_texts, n_results=n_results)
+    return get_collection(name, ef).query(query_texts=query_texts, n_results=n_results)
+
+
+def sync_csv(name, path, ef):
+    """Bring collection `name` in line with the question/answer CSV at `path`.
+
+    Only questions that are not stored yet are embedded. Rows whose answer changed
+    get a metadata update and rows missing from the CSV are deleted.
+    """
+    collection = _open_collection(name, ef)
+
+    wanted = {}
+    with open(path, newline="") as f:
+        for row in csv.DictReader(f):
+            question, answer = row["question"], row["answer"]
+            wanted[row_id(question)] = (question, answer, content_hash(question, answer))
+
+    existing = collection.get(include=["metadatas"])
+    stored = {
+        id_: (meta or {}).get("content_hash")
+        for id_, meta in zip(existing["ids"], existing["metadatas"])
+    }
+
+    added = [id_ for id_ in wanted if id_ not in stored]
+    changed = [id_ for id_ in wanted if id_ in stored and stored[id_] != wanted[id_][2]]
+    removed = [id_ for id_ in stored if id_ not in wanted]
+
+    if added:
+        collection.add(
+            ids=added,
+            documents=[wanted[id_][0] for id_ in added],
+            metadatas=[{"answer": wanted[id_][1], "content_hash": wanted[id_][2]} for id_ in added],
+        )
+    if changed:
+        collection.update(
+            ids=changed,
+            metadatas=[{"answer": wanted[id_][1], "content_hash": wanted[id_][2]} for id_ in changed],
+        )
+    if removed:
+        collection.delete(ids=removed)
+
+    print(f"{name}: {len(added)} embedded, {len(changed)} updated, {len(removed)} removed, "
+          f"{len(wanted) - len(added) - len(changed)} unchanged")
+    _collections[name] = collection
+    if VECTOR_INDEX == "numpy":
+        import np_index
+        np_index.build(name, collection, ef)
+    return collection
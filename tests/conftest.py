@@ -0,0 +1,31 @@
+import shutil
+import sys
+from pathlib import Path
+
+import pytest
+
+app_dir = Path(__file__).parent.parent / "app"
+# the app modules import each other by bare name, as when run from app/
+sys.path.insert(0, str(app_dir))
+
+import catalog  # noqa: E402
+import db_pool  # noqa: E402
+import fast_sql  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def prepared_db(tmp_path_factory):
+    """A copy of the bundled catalog with the indexes, product_fts and rankings built."""
+    path = tmp_path_factory.mktemp("catalog") / "db.sqlite"
+    shutil.copy(app_dir / "db.sqlite", path)
+    catalog.prepare_catalog(path)
+    return path
+
+
+@pytest.fixture
+def catalog_db(prepared_db, monkeypatch):
+    db_pool.close_all()
+    monkeypatch.setattr(db_pool, "sqldb_path", prepared_db)
+    monkeypatch.setattr(fast_sql, "_brands", None)
+    yield prepared_db
+    db_pool.close_all()
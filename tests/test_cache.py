@@ -0,0 +1,61 @@
+from collections import OrderedDict
+
+import numpy as np
+import pytest
+
+import cache
+
+
+@pytest.fixture(autouse=True)
+def _fresh(monkeypatch):
+    monkeypatch.setattr(cache, "_entries", OrderedDict())
+    monkeypatch.setattr(cache, "counters", dict.fromkeys(cache.counters, 0))
+
+
+def vector(*values):
+    return np.array(values, dtype=np.float32)
+
+
+def test_similar_question_hits():
+    cache.store("faq", "How do I return an item?", vector(1, 0, 0), "Within 10 days.")
+    assert cache.lookup("faq", "how to return an item", vector(0.98, 0.05, 0)) == "Within 10 days."
+    assert cache.lookup("faq", "track my order", vector(0, 1, 0)) is None
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+
+def test_numbers_must_match():
+    cache.store("sql", "laptops below 80k", vector(1, 0), "answer for 80k")
+    assert cache.lookup("sql", "laptops below 50k", vector(1, 0)) is None
+    assert cache.lookup("sql", "laptops under 80k", vector(1, 0)) == "answer for 80k"
+
+
+def test_routes_do_not_mix():
+    cache.store("faq", "payment options", vector(1, 0), "UPI and cards.")
+    assert cache.lookup("sql", "payment options", vector(1, 0)) is None
+
+
+def test_uncached_routes(monkeypatch):
+    monkeypatch.setitem(cache.ROUTE_TTL, "general_qa", 0)
+    cache.store("general_qa", "hello", vector(1, 0), "Hi!")
+    cache.store("faq", "empty", vector(1, 0), "")
+    assert cache.stats()["entries"] == 0
+    assert cache.lookup("general_qa", "hello", vector(1, 0)) is None
+
+
+def test_expired_entries_are_dropped(monkeypatch):
+    cache.store("faq", "payment options", vector(1, 0), "UPI and cards.")
+    now = cache.time.time()
+    monkeypatch.setattr(cache.time, "time", lambda: now + cache.ROUTE_TTL["faq"] + 1)
+    assert cache.lookup("faq", "payment options", vector(1, 0)) is None
+    assert cache.stats()["expired"] == 1 and cache.stats()["entries"] == 0
+
+
+def test_least_recently_used_is_evicted(monkeypatch):
+    monkeypatch.setattr(cache, "MAX_ENTRIES", 2)
+    cache.store("faq", "first", vector(1, 0, 0), "1")
+    cache.store("faq", "second", vector(0, 1, 0), "2")
+    assert cache.lookup("faq", "first", vector(1, 0, 0)) == "1"
+    cache.store("faq", "third", vector(0, 0, 1), "3")
+    assert cache.lookup("faq", "second", vector(0, 1, 0)) is None
+    assert cache.lookup("faq", "first", vector(1, 0, 0)) == "1"
+    assert cache.stats()["evictions"] == 1
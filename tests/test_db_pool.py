@@ -0,0 +1,39 @@
+import pytest
+
+import db_pool
+
+
+@pytest.mark.parametrize("statement, expected", [
+    ("SELECT * FROM product", "SELECT * FROM product LIMIT 50"),
+    ("SELECT * FROM product;", "SELECT * FROM product LIMIT 50"),
+    ("SELECT * FROM product LIMIT 5", "SELECT * FROM product LIMIT 5"),
+    ("SELECT * FROM product limit 500", "SELECT * FROM product LIMIT 50"),
+    ("SELECT * FROM product LIMIT 500 OFFSET 20", "SELECT * FROM product LIMIT 50 OFFSET 20"),
+    ("SELECT * FROM product LIMIT 20, 500", "SELECT * FROM product LIMIT 20, 50"),
+    ("SELECT * FROM product LIMIT 10 * 10", "SELECT * FROM (SELECT * FROM product LIMIT 10 * 10) LIMIT 50"),
+    # a LIMIT inside a subquery does not cap the outer statement
+    ("SELECT * FROM product WHERE rowid IN (SELECT rowid FROM product LIMIT 5)",
+     "SELECT * FROM product WHERE rowid IN (SELECT rowid FROM product LIMIT 5) LIMIT 50"),
+])
+def test_enforce_limit(statement, expected):
+    assert db_pool.enforce_limit(statement, 50) == expected
+
+
+def test_execute_caps_rows(catalog_db):
+    rows = db_pool.execute("SELECT title, price FROM product ORDER BY price LIMIT 100", limit=3)
+    assert len(rows) == 3 and set(rows[0]) == {"title", "price"}
+
+
+def test_connections_are_read_only(catalog_db):
+    with pytest.raises(Exception):
+        db_pool.execute("DELETE FROM product", limit=None)
+
+
+def test_close_all_leaves_connections_in_use(catalog_db):
+    with db_pool.connection() as held:
+        db_pool.execute("SELECT 1", limit=None)
+        db_pool.close_all()
+        assert db_pool._created == 1
+        held.execute("SELECT 1")
+    db_pool.close_all()
+    assert db_pool._created == 0
@@ -0,0 +1,80 @@
+import pytest
+
+import fast_sql
+
+
+@pytest.fixture(autouse=True)
+def _db(catalog_db):
+    pass
+
+
+def test_price_and_brand():
+    sql, params = fast_sql.compile_query("Nike shoes below 5000")
+    assert "LOWER(brand) IN (?)" in sql and "price <= ?" in sql
+    assert params == ('"shoes"', "nike", 5000)
+
+
+@pytest.mark.parametrize("question, amount", [
+    ("laptops below 80k", 80_000),
+    ("iphone under 1 lakh", 100_000),
+    ("shoes under rs 99", 99),
+])
+def test_price_units(question, amount):
+    _, params = fast_sql.compile_query(question)
+    assert params[-1] == amount
+
+
+def test_price_range_is_sorted():
+    _, params = fast_sql.compile_query("shoes in price range 5000 to 1000")
+    assert params[-2:] == (1000, 5000)
+
+
+@pytest.mark.parametrize("question, rating", [
+    ("4.5 star shoes", 4.5),
+    ("shoes with 4+ rating", 4.0),
+    ("laptops rated above 4", 4.0),
+    ("laptops rated above 4 stars", 4.0),
+    ("phones under 20000 with 4 star rating", 4.0),
+])
+def test_min_rating(question, rating):
+    sql, params = fast_sql.compile_query(question)
+    assert "avg_rating >= ?" in sql
+    assert rating in params
+
+
+@pytest.mark.parametrize("question", [
+    # a price or a rating, the LLM decides
+    "phones above 4 rating",
+    "tv above 4 star",
+    # too small for a price and no unit
+    "shoes under 5",
+    # a rating without a comparison or a unit
+    "phones rated 4",
+    "compare iphone 13 and iphone 14",
+    "₹5000 shoes",
+])
+def test_left_to_the_llm(question):
+    assert fast_sql.compile_query(question) is None
+
+
+@pytest.mark.parametrize("question, limit", [
+    ("top 5 rated laptops", 5),
+    ("show me top 3 laptops", 3),
+])
+def test_top_n_is_a_row_count(question, limit):
+    sql, params = fast_sql.compile_query(question)
+    assert sql.endswith(f"LIMIT {limit}")
+    assert "avg_rating >= ?" not in sql
+    assert f'"{limit}"' not in params[0]
+
+
+def test_rating_sort_reads_the_rankings():
+    sql, _ = fast_sql.compile_query("Which is the best rated shoes?")
+    assert sql.startswith("SELECT * FROM product_ranked")
+    assert "product_rowid IN" in sql and sql.endswith("ORDER BY score_rank ASC")
+
+
+def test_compiled_sql_runs():
+    for question in ["top rated mobiles under 20000", "samsung phones with rating above 4 sorted by popularity"]:
+        sql, params = fast_sql.compile_query(question)
+        fast_sql.db_pool.execute(sql, params)
@@ -0,0 +1,59 @@
+from collections import OrderedDict
+
+import pytest
+
+import memory
+
+
+@pytest.fixture
+def requests(monkeypatch):
+    monkeypatch.setattr(memory, "_sessions", OrderedDict())
+    monkeypatch.setattr(memory, "_bytes", 0)
+    calls = []
+    monkeypatch.setattr(memory.summarizer, "request", lambda key, messages, summarize: calls.append((key, messages)))
+    monkeypatch.setattr(memory.summarizer, "merge", lambda key, summary: summary)
+    monkeypatch.setattr(memory.summarizer, "discard", lambda key: None)
+    return calls
+
+
+def test_no_session(requests):
+    memory.remember(None, "hi", "hello", None)
+    assert memory.load(None) == ("", [])
+    assert memory.stats()["sessions"] == 0
+
+
+def test_recent_turns(requests):
+    memory.remember("s1", "hi", "hello", None)
+    memory.remember("s1", "shoes under 2000", "Here are some shoes.", None)
+    assert memory.load("s1") == ("", [
+        "User: hi", "Assistant: hello", "User: shoes under 2000", "Assistant: Here are some shoes.",
+    ])
+    assert memory.load("s2") == ("", [])
+
+
+def test_oldest_turn_is_summarized(requests, monkeypatch):
+    monkeypatch.setattr(memory, "MAX_TURNS", 2)
+    for i in range(3):
+        memory.remember("s1", f"question {i}", f"answer {i}", None)
+    assert requests == [("s1", ["User: question 0", "Assistant: answer 0"])]
+    _, recent = memory.load("s1")
+    assert recent[0] == "User: question 1" and len(recent) == 4
+
+
+def test_long_messages_are_cut(requests):
+    memory.remember("s1", "x" * (memory.MESSAGE_CHARS + 10), "ok", None)
+    assert memory.load("s1")[1][0] == "User: " + "x" * memory.MESSAGE_CHARS
+
+
+def test_sessions_are_evicted(requests, monkeypatch):
+    monkeypatch.setattr(memory, "MAX_SESSIONS", 2)
+    for session_id in ("a", "b", "c"):
+        memory.remember(session_id, "hi", "hello", None)
+    assert memory.stats()["sessions"] == 2
+    assert memory.load("a") == ("", [])
+
+
+def test_forget(requests):
+    memory.remember("s1", "hi", "hello", None)
+    memory.forget("s1")
+    assert memory.stats()["sessions"] == 0 and memory.stats()["bytes"] == 0
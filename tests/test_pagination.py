@@ -0,0 +1,69 @@
+import pytest
+
+import pagination
+
+
+@pytest.mark.parametrize("query", ["more", "show more", "ok show me more results please", "next page"])
+def test_more_requests(query):
+    assert pagination.is_more_request(query)
+
+
+@pytest.mark.parametrize("query", ["more shoes under 2000", "what is next day delivery"])
+def test_not_more_requests(query):
+    assert not pagination.is_more_request(query)
+
+
+def test_split_statement():
+    base, keys, cap = pagination.split_statement(
+        "SELECT * FROM product WHERE price < 5000 ORDER BY avg_rating DESC, price LIMIT 10;"
+    )
+    assert base == "SELECT * FROM product WHERE price < 5000"
+    assert keys == [("avg_rating", True), ("price", False), ("product_link", False)]
+    assert cap == 10
+
+
+def test_split_statement_keeps_subquery_clauses():
+    statement = ("SELECT * FROM product WHERE rowid IN "
+                 "(SELECT rowid FROM product ORDER BY total_ratings DESC LIMIT 5)")
+    assert pagination.split_statement(statement) == (statement, [("product_link", False)], None)
+
+
+@pytest.mark.parametrize("statement", [
+    "SELECT brand, AVG(price) FROM product GROUP BY brand",
+    "SELECT * FROM product ORDER BY price * avg_rating",
+    "SELECT * FROM product ORDER BY price LIMIT 5 OFFSET 10",
+    "SELECT * FROM product ORDER BY price LIMIT 2 + 3",
+])
+def test_split_statement_refuses(statement):
+    assert pagination.split_statement(statement) is None
+
+
+def test_keyset_pages_follow_the_statement(catalog_db):
+    statement = "SELECT * FROM product WHERE price < 3000 ORDER BY avg_rating DESC, total_ratings DESC"
+    # ties are broken on product_link, the expected order has to do the same
+    expected = pagination.db_pool.execute(statement + ", product_link", limit=12)
+
+    rows, cursor = pagination.first_page(statement, page_size=4)
+    pages = [rows]
+    for _ in range(2):
+        rows, cursor = pagination.next_page(cursor, page_size=4)
+        pages.append(rows)
+    assert cursor["keys"] is not None
+    assert [row["product_link"] for page in pages for row in page] == [row["product_link"] for row in expected]
+
+
+def test_pages_stop_at_the_limit(catalog_db):
+    rows, cursor = pagination.first_page("SELECT * FROM product ORDER BY price LIMIT 6", page_size=4)
+    assert len(rows) == 4
+    rows, cursor = pagination.next_page(cursor, page_size=4)
+    assert len(rows) == 2
+    rows, cursor = pagination.next_page(cursor, page_size=4)
+    assert rows == []
+
+
+def test_offset_fallback(catalog_db):
+    statement = "SELECT brand, COUNT(*) AS n FROM product GROUP BY brand ORDER BY n DESC, brand"
+    expected = pagination.db_pool.execute(statement, limit=6)
+    first, cursor = pagination.first_page(statement, page_size=3)
+    second, _ = pagination.next_page(cursor, page_size=3)
+    assert first + second == expected
@@ -0,0 +1,19 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+pytest.importorskip("semantic_router")
+import router  # noqa: E402
+
+
+def test_score_batch(monkeypatch):
+    monkeypatch.setattr(router, "get_router", lambda: SimpleNamespace(top_k=2))
+    matrix = np.array([[1, 0, 0], [0.9, 0.1, 0], [0, 1, 0], [0, 0.9, 0.1]], dtype=np.float32)
+    matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+    utterances = (matrix, np.array([0, 0, 1, 1]), ["faq", "sql"], np.array([0.5, 0.8]))
+
+    results = router.score_batch([[2, 0, 0], [0, 1, 0.05], [0, 0, 1]], utterances)
+    assert [name for name, _ in results] == ["faq", "sql", None]
+    assert results[0][1] == pytest.approx((1 + matrix[1, 0]) / 2)
+    assert results[2] == (None, None)
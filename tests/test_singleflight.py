@@ -0,0 +1,63 @@
+import threading
+
+import pytest
+
+import singleflight
+
+
+def test_followers_replay_the_leader():
+    release = threading.Event()
+    calls = []
+
+    def produce():
+        calls.append(1)
+
+        def chunks():
+            yield "a"
+            release.wait(5)
+            yield "b"
+        return chunks()
+
+    leader = singleflight.stream("q", produce)
+    assert next(leader) == "a"
+    follower = singleflight.stream("q", produce)
+    received = []
+    thread = threading.Thread(target=lambda: received.extend(follower))
+    thread.start()
+    release.set()
+    assert list(leader) == ["b"]
+    thread.join(5)
+
+    assert received == ["a", "b"] and calls == [1]
+    assert singleflight.stats()["in_flight"] == 0
+
+
+def test_errors_reach_followers():
+    def produce():
+        def chunks():
+            yield "a"
+            raise RuntimeError("upstream failed")
+        return chunks()
+
+    leader = singleflight.stream("failing", produce)
+    assert next(leader) == "a"
+    follower = singleflight.stream("failing", produce)
+    with pytest.raises(RuntimeError):
+        list(leader)
+    with pytest.raises(RuntimeError):
+        list(follower)
+    assert singleflight.stats()["in_flight"] == 0
+
+
+def test_a_finished_flight_is_not_reused():
+    for _ in range(2):
+        assert list(singleflight.stream("done", lambda: iter(["x"]))) == ["x"]
+
+
+def test_produce_error_clears_the_flight():
+    def produce():
+        raise ValueError("no answer")
+
+    with pytest.raises(ValueError):
+        list(singleflight.stream("broken", produce))
+    assert list(singleflight.stream("broken", lambda: iter(["ok"]))) == ["ok"]
@@ -0,0 +1,68 @@
+from collections import OrderedDict
+
+import pytest
+
+import sql_templates
+
+
+@pytest.fixture(autouse=True)
+def _fresh(catalog_db, monkeypatch):
+    monkeypatch.setattr(sql_templates, "_entries", OrderedDict())
+    monkeypatch.setattr(sql_templates, "_schema_version", None)
+
+
+def test_templatize():
+    assert sql_templates.templatize("Nike shoes below 5k") == ("{b0} shoes below {n0}", {"b0": "nike", "n0": 5000})
+    assert sql_templates.templatize("phones between 10,000 and 20000") == (
+        "phones between {n0} and {n1}", {"n0": 10000, "n1": 20000})
+
+
+def test_parameterize():
+    statement, recipes = sql_templates.parameterize(
+        "SELECT * FROM product WHERE LOWER(brand) = 'nike' AND title LIKE '%nike shoes%' AND price < 5000 LIMIT 10",
+        {"b0": "nike", "n0": 5000},
+    )
+    assert statement == "SELECT * FROM product WHERE LOWER(brand) = ? AND title LIKE ? AND price < ? LIMIT 10"
+    assert recipes == ["{b0:key:lower}", "%{b0:key:lower} shoes%", "{n0}"]
+
+
+@pytest.mark.parametrize("statement", [
+    # brand compared as written, another brand's spelling cannot be filled in
+    "SELECT * FROM product WHERE brand = 'nike' AND price < 5000",
+    "SELECT * FROM product WHERE brand IN ('nike') AND price < 5000",
+    # 5000 never shows up in the SQL
+    "SELECT * FROM product WHERE LOWER(brand) = 'nike'",
+])
+def test_parameterize_refuses(statement):
+    assert sql_templates.parameterize(statement, {"b0": "nike", "n0": 5000}) is None
+
+
+def test_parameterize_refuses_repeated_numbers():
+    assert sql_templates.parameterize("SELECT * FROM product WHERE price BETWEEN 100 AND 100",
+                                      {"n0": 100, "n1": 100}) is None
+
+
+def test_case_insensitive_contexts():
+    for statement in [
+        "SELECT * FROM product WHERE UPPER(brand) IN ('NIKE', 'X') AND price < 5000",
+        "SELECT * FROM product WHERE rowid IN (SELECT rowid FROM product_fts WHERE product_fts MATCH 'brand:nike') "
+        "AND price < 5000",
+    ]:
+        assert sql_templates.parameterize(statement, {"b0": "nike", "n0": 5000}) is not None
+
+
+def test_store_and_lookup():
+    assert sql_templates.store(
+        "Nike shoes below 5k", "SELECT * FROM product WHERE LOWER(brand) = 'nike' AND price < 5000 ORDER BY price"
+    )
+    statement, params = sql_templates.lookup("puma shoes below 3000")
+    assert statement == "SELECT * FROM product WHERE LOWER(brand) = ? AND price < ? ORDER BY price"
+    assert params == ("puma", 3000)
+    assert sql_templates.db_pool.execute(statement, params)
+    assert sql_templates.lookup("puma shoes above 3000") is None
+
+
+def test_store_rejects_invalid_sql():
+    assert not sql_templates.store("shoes below 5000", "SELECT * FROM products WHERE price < 5000")
+    assert not sql_templates.store("shoes below 5000", "DELETE FROM product WHERE price < 5000")
+    assert sql_templates.lookup("shoes below 5000") is None